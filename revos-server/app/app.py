@@ -1,37 +1,120 @@
 from dotenv import load_dotenv
 import os
 import sys
+import atexit
+import hashlib
+import heapq
 import logging
-from flask import Flask, request, jsonify
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import orjson
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import delete, event, inspect, lambda_stmt, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from flask_cors import CORS
+from flask_compress import Compress
+from plaid import ApiException
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from google_auth_oauthlib.flow import Flow
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from datetime import date, datetime, timedelta
 
 # Add the parent directory to the path so we can import app modules
 sys.path.insert(0, os.path.dirname(__file__))
 
 from utils.openai import (
+    client,
     query_syllabus_content, 
     process_uploaded_file,
-    initialize_openai_service,
-    get_service_status
+    store_syllabus,
+    get_service_status,
+    pinecone_manager,
+    semantic_cache,
+    wait_for_chat_budget
 )
-from models import db, User, Syllabus
-from auth import auth_bp, require_auth
+from utils.google_calendar import CENTRAL_TZ, GoogleCalendarManager
+from utils.canvas import CanvasCalendarManager
+from utils.plaid import PlaidManager
+from utils.jobs import job_queue, redis_conn, process_upload_job, JOB_RESULT_TTL
+from models import db, User, Syllabus, WeeklyReview, PlaidTransaction
+from auth import auth_bp, current_user, require_auth
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize jsonify() responses with orjson, falling back to Flask's defaults for other types."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding and re-encoding them
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS),
+            mimetype=self.mimetype
+        )
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
+# Compress JSON responses large enough to benefit (syllabus lists, full syllabi)
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 5
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
+
 # Configure session support for OAuth
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Reject oversize request bodies in werkzeug before they are read or parsed
+app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024
+
+# Configure logging. Request threads only enqueue records; a background
+# listener thread does the actual stderr writes. Set LOG_LEVEL=WARNING in
+# production to skip debug/info formatting entirely.
+log_handler = QueueHandler(queue.SimpleQueue())
+log_listener = None
+
+def start_log_listener():
+    """Point the log handler at a fresh queue and start a listener thread draining it.
+
+    Threads don't survive fork(), so preloaded gunicorn workers call this again
+    (via reset_after_fork) rather than inheriting the master's queue.
+    """
+    global log_listener
+    log_handler.queue = queue.SimpleQueue()
+    log_listener = QueueListener(log_handler.queue, logging.StreamHandler())
+    log_listener.start()
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), handlers=[log_handler], force=True)
+start_log_listener()
+atexit.register(lambda: log_listener.stop())
 logger = logging.getLogger(__name__)
 
 # Database configuration
@@ -39,6 +122,28 @@ logger = logging.getLogger(__name__)
 db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'revos.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 20,
+    'max_overflow': 40,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+    'connect_args': {'check_same_thread': False},
+}
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection so readers don't block on the writer."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
 
 # Initialize database
 db.init_app(app)
@@ -46,55 +151,251 @@ db.init_app(app)
 # Create tables
 with app.app_context():
     db.create_all()
-    initialize_openai_service()
+    # create_all() skips tables that already exist, so add any nullable columns
+    # and model indexes an older database is missing
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"✅ Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    # Close the startup connections so none are open if gunicorn forks workers next
+    db.engine.dispose()
+
+def reset_after_fork():
+    """Drop state a forked worker must not share with the process that imported the app.
+
+    SQLite connections can't be carried across fork(), so the pool inherited
+    from the startup work above is discarded (close=False leaves the parent's
+    connections alone), and the worker starts its own log listener.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_log_listener()
 
 # Register authentication blueprint
 app.register_blueprint(auth_bp)
 
+ALLOWED_EXTENSIONS = frozenset(('pdf', 'docx', 'doc', 'txt'))
+ALLOWED_EXTENSIONS_TEXT = 'pdf, docx, doc, txt'
+HEALTH_CACHE_TTL = 5
+SYLLABUS_LIST_BATCH_SIZE = 200
+CAMPUS_RECOMMENDATIONS_TTL = 24 * 60 * 60
+WEEKLY_ADVISOR_CACHE_TTL = 60 * 60
+
+GOOGLE_CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), 'google_calendar_credentials.json')
+GOOGLE_OAUTH_SCOPES = ['https://www.googleapis.com/auth/calendar']
+# Refresh Google access tokens this long before they expire
+GOOGLE_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Threads for the independent network lookups a single request fans out to
+context_executor = ThreadPoolExecutor(max_workers=int(os.getenv('CONTEXT_THREADS', '32')), thread_name_prefix='context')
+
+# Static prompt pieces, built once instead of per request
+WORKSHEET_SYSTEM_MESSAGE = {"role": "system", "content": "You are an expert educator creating practice worksheets. Respond with JSON only."}
+STUDY_PLAN_SYSTEM_MESSAGE = {"role": "system", "content": "You are an expert academic advisor creating personalized study plans. Respond with JSON only."}
+CAMPUS_SYSTEM_MESSAGE = {"role": "system", "content": "You are a knowledgeable Texas A&M student guide providing accurate campus recommendations. Respond with JSON only."}
+WEEKLY_ADVISOR_SYSTEM_MESSAGE = {"role": "system", "content": "You are Rev, a supportive and organized academic advisor. Always format responses clearly with markdown, headers, and bullet points. Be specific, actionable, and motivational."}
+ASK_QUESTION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are Rev, a knowledgeable and detailed AI study assistant at Texas A&M University.
+
+CRITICAL: When discussing ANY assignment, exam, quiz, homework, or deadline:
+- ALWAYS mention which course/class it belongs to
+- ALWAYS include the course code if available (e.g., CSCE 314, MATH 251)
+- Format as: "[COURSE NAME] Assignment Name"
+
+Be specific, helpful, and organized. Use the student's calendar and syllabus data extensively."""
+}
+
+KEY_DATE_LINE = "    - [{course}] {event} ({type}): {date}\n"
+
+ASK_QUESTION_RULES = """You are Rev, an AI study assistant at Texas A&M University.
+
+IMPORTANT RULES:
+1. When mentioning ANY assignment, exam, quiz, homework, or deadline - ALWAYS specify which course/class it belongs to
+2. Use the course information provided below as context
+3. For schedule questions, use BOTH the Google Calendar events AND the syllabus key dates
+4. Provide accurate dates and times
+5. Be specific and actionable"""
+
+ASK_QUESTION_INSTRUCTIONS = """Provide a clear, helpful answer that:
+1. Directly addresses the question
+2. When mentioning assignments/exams/quizzes, ALWAYS include the course name (e.g., "CSCE 314 Midterm")
+3. Uses calendar and syllabus information when relevant
+4. For schedule questions, reference specific dates from calendar or syllabi
+5. Provides actionable advice
+6. Suggests follow-up actions when appropriate"""
+
+# Questions mentioning any of these are treated as calendar/schedule questions.
+# Substring matches, like the keyword list this replaces, so "exams" still counts
+CALENDAR_QUESTION_RE = re.compile(
+    r'calendar|schedule|when|date|time|exam|quiz|assignment|due|deadline|meeting'
+    r'|class|week|today|tomorrow|next|busy|free|available',
+    re.IGNORECASE
+)
+
+# (computed_at, serialized body, status code), swapped in as one tuple so a
+# probe never sees a timestamp from one check paired with another's status
+_health_cache = (float('-inf'), None, 500)
+_health_lock = threading.Lock()
+
+def get_owned_syllabus(syllabus_id: int, user_id: int):
+    """Load one of the user's syllabi through a statement compiled once and cached."""
+    stmt = lambda_stmt(lambda: select(Syllabus).where(Syllabus.id == syllabus_id, Syllabus.user_id == user_id))
+    return db.session.execute(stmt).scalar_one_or_none()
+
+def get_user_with_syllabi(user_id: int, *syllabus_columns, user_columns=()):
+    """Load a user and all of their syllabi in one round of batched queries.
+
+    Pass Syllabus columns (or ``user_columns``) to load only those, plus the
+    keys, instead of every column.
+    """
+    syllabi = selectinload(User.syllabi)
+    if syllabus_columns:
+        syllabi = syllabi.load_only(*syllabus_columns)
+    stmt = select(User).options(syllabi).where(User.id == user_id)
+    if user_columns:
+        stmt = stmt.options(load_only(*user_columns))
+    return db.session.execute(stmt).scalar_one_or_none()
+
+def get_plaid_access_token(user_id: int):
+    """Fetch and decrypt only the user's Plaid access token, once per request."""
+    if 'plaid_access_token' not in g:
+        g.plaid_access_token = PlaidManager.decrypt_access_token(db.session.execute(
+            select(User.plaid_access_token).where(User.id == user_id)
+        ).scalar_one_or_none())
+    return g.plaid_access_token
+
+def sync_plaid_transactions(user_id: int, access_token: str):
+    """Apply the user's Plaid transaction changes since their last sync to plaid_transactions."""
+    cursor = db.session.execute(
+        select(User.plaid_sync_cursor).where(User.id == user_id)
+    ).scalar_one_or_none()
+    changes = PlaidManager.sync_transactions(access_token, cursor)
+    
+    # The sync result is ours alone, so its dicts become the insert rows in place
+    rows = changes['added'] + changes['modified']
+    for row in rows:
+        row['user_id'] = user_id
+        row['date'] = date.fromisoformat(row['date'])
+    if rows:
+        stmt = sqlite_insert(PlaidTransaction)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['transaction_id'],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != 'transaction_id'}
+        ), rows)
+    if changes['removed']:
+        db.session.execute(delete(PlaidTransaction).where(
+            PlaidTransaction.user_id == user_id,
+            PlaidTransaction.transaction_id.in_(changes['removed'])
+        ))
+    db.session.execute(
+        update(User).where(User.id == user_id).values(plaid_sync_cursor=changes['next_cursor'])
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def user_exists(user_id: int) -> bool:
+    """Check that the user still exists without loading the full row."""
+    return db.session.execute(select(User.id).where(User.id == user_id)).first() is not None
+
+def update_user(user_id: int, **values) -> bool:
+    """Write columns on a user with a single UPDATE; False if the user is gone."""
+    result = db.session.execute(
+        update(User).where(User.id == user_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    """Return JSON instead of werkzeug's HTML page for oversize uploads."""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'File too large. Maximum size is {limit_mb} MB'}), 413
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify service status."""
-    status = get_service_status()
-    return jsonify(status), 200 if status['openai'] and status['pinecone'] else 500
+    # Probes hit this every few seconds; serve a recent result unless ?force=1
+    global _health_cache
+    force = request.args.get('force') == '1'
+    if force or time.monotonic() - _health_cache[0] >= HEALTH_CACHE_TTL:
+        # Only one thread re-checks; probes arriving meanwhile get the last result
+        if _health_lock.acquire(blocking=force or _health_cache[1] is None):
+            try:
+                if force or time.monotonic() - _health_cache[0] >= HEALTH_CACHE_TTL:
+                    status = get_service_status()
+                    code = 200 if status['openai'] and status['pinecone'] else 500
+                    _health_cache = (time.monotonic(), orjson.dumps(status), code)
+            finally:
+                _health_lock.release()
+    _, body, code = _health_cache
+    return Response(body, mimetype='application/json'), code
 
 @app.route('/api/syllabus/upload', methods=['POST'])
 @require_auth
 def upload_syllabus():
     """Upload and store syllabus data in vector database."""
-    print(f"🔥 UPLOAD REQUEST - User: {request.user_id}")
-    print(f"🔥 UPLOAD REQUEST - Method: {request.method}")
-    print(f"🔥 UPLOAD REQUEST - Content-Type: {request.content_type}")
-    print(f"🔥 UPLOAD REQUEST - Files: {list(request.files.keys())}")
+    # Refuse on the declared length before anything touches the body
+    if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        return handle_request_too_large(None)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔥 UPLOAD REQUEST - User: %s", request.user_id)
+        logger.debug("🔥 UPLOAD REQUEST - Method: %s", request.method)
+        logger.debug("🔥 UPLOAD REQUEST - Content-Type: %s", request.content_type)
+        logger.debug("🔥 UPLOAD REQUEST - Files: %s", list(request.files.keys()))
     
     try:
         # Check if it's a file upload or JSON data
         if 'file' in request.files:
             # Handle file upload
             file = request.files['file']
-            print(f"🔥 FILE UPLOAD - Filename: {file.filename}")
-            print(f"🔥 FILE UPLOAD - Content-Type: {file.content_type}")
+            logger.debug("🔥 FILE UPLOAD - Filename: %s", file.filename)
+            logger.debug("🔥 FILE UPLOAD - Content-Type: %s", file.content_type)
             
             if file.filename == '':
-                print("❌ ERROR: No file selected")
+                logger.warning("❌ ERROR: No file selected")
                 return jsonify({'error': 'No file selected'}), 400
             
             # Validate file type
-            allowed_extensions = {'pdf', 'docx', 'doc', 'txt'}
-            file_extension = file.filename.lower().split('.')[-1] if '.' in file.filename else ''
+            _, dot, file_extension = file.filename.rpartition('.')
+            file_extension = file_extension.lower() if dot else ''
             
-            if file_extension not in allowed_extensions:
-                error_msg = f'Unsupported file type: {file_extension}. Allowed: {", ".join(allowed_extensions)}'
-                print(f"❌ ERROR: {error_msg}")
+            if file_extension not in ALLOWED_EXTENSIONS:
+                error_msg = f'Unsupported file type: {file_extension}. Allowed: {ALLOWED_EXTENSIONS_TEXT}'
+                logger.warning("❌ ERROR: %s", error_msg)
                 return jsonify({'error': error_msg}), 400
             
-            # Read file content
-            file_content = file.read()
+            # Hand the spooled upload stream straight to the processor instead of
+            # copying the whole file into memory
             filename = secure_filename(file.filename)
-            print(f"🔥 FILE UPLOAD - Size: {len(file_content)} bytes")
+            logger.debug("🔥 FILE UPLOAD - Size: %s bytes", request.content_length)
+            
+            # ?async=1 hands the file to the background worker and returns a
+            # job id to poll instead of holding the connection open
+            if request.args.get('async', '').lower() in ('1', 'true'):
+                fd, tmp_path = tempfile.mkstemp(suffix=f'.{file_extension}')
+                with os.fdopen(fd, 'wb') as tmp_file:
+                    file.save(tmp_file)
+                job = job_queue.enqueue(
+                    process_upload_job, tmp_path, filename, request.user_id,
+                    meta={'user_id': request.user_id},
+                    result_ttl=JOB_RESULT_TTL
+                )
+                logger.info("✅ Queued upload job %s for %s", job.id, filename)
+                return jsonify({'job_id': job.id, 'status': 'queued'}), 202
             
             # Process the file
-            result = process_uploaded_file(file_content, filename, request.user_id)
-            print(f"🔥 FILE UPLOAD - Result: {result}")
+            result = process_uploaded_file(file.stream, filename, request.user_id)
+            logger.debug("🔥 FILE UPLOAD - Result: %s", result)
             
             if result['success']:
                 return jsonify({
@@ -102,16 +403,16 @@ def upload_syllabus():
                     'data': result['data']
                 }), 200
             else:
-                print(f"❌ ERROR: {result['error']}")
+                logger.error("❌ ERROR: %s", result['error'])
                 return jsonify({'error': result['error']}), 500
         
         else:
             # Handle JSON data (text input)
             data = request.get_json()
-            print(f"🔥 JSON DATA: {data}")
+            logger.debug("🔥 JSON DATA: %s", data)
             
             if not data:
-                print("❌ ERROR: No data provided")
+                logger.warning("❌ ERROR: No data provided")
                 return jsonify({'error': 'No data provided'}), 400
             
             # Check if it's raw text
@@ -119,14 +420,14 @@ def upload_syllabus():
                 # Process raw text like a file
                 raw_text = data['raw_text']
                 if not raw_text.strip():
-                    print("❌ ERROR: No text content provided")
+                    logger.warning("❌ ERROR: No text content provided")
                     return jsonify({'error': 'No text content provided'}), 400
                 
-                print(f"🔥 TEXT UPLOAD - Size: {len(raw_text)} chars")
+                logger.debug("🔥 TEXT UPLOAD - Size: %d chars", len(raw_text))
                 
                 # Process the text using the same function as file uploads
                 result = process_uploaded_file(raw_text.encode('utf-8'), 'text_input.txt', request.user_id)
-                print(f"🔥 TEXT UPLOAD - Result: {result}")
+                logger.debug("🔥 TEXT UPLOAD - Result: %s", result)
                 
                 if result['success']:
                     return jsonify({
@@ -134,31 +435,76 @@ def upload_syllabus():
                         'data': result['data']
                     }), 200
                 else:
-                    print(f"❌ ERROR: {result['error']}")
+                    logger.error("❌ ERROR: %s", result['error'])
                     return jsonify({'error': result['error']}), 500
             
             else:
-                print("❌ ERROR: No file or raw_text provided")
+                logger.warning("❌ ERROR: No file or raw_text provided")
                 return jsonify({'error': 'No file or raw_text provided'}), 400
             
     except Exception as e:
-        print(f"❌ EXCEPTION: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ EXCEPTION in upload_syllabus: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/syllabus/status/<job_id>', methods=['GET'])
+@require_auth
+def get_upload_status(job_id):
+    """Poll the status of a background syllabus upload."""
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job.meta.get('user_id') != request.user_id:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = job.get_status()
+    response = {'job_id': job.id, 'status': status}
+    if status == 'finished':
+        result = job.return_value()
+        if result['success']:
+            response.update(message=result['message'], data=result['data'])
+        else:
+            response.update(status='failed', error=result['error'])
+    elif status == 'failed':
+        response['error'] = 'Processing failed'
+    return jsonify(response), 200
+
 @app.route('/api/syllabus/list', methods=['GET'])
 @require_auth
 def list_syllabi():
     """Get all syllabi for the authenticated user."""
     try:
-        syllabi = Syllabus.query.filter_by(user_id=request.user_id).all()
-        return jsonify({
-            'syllabi': [s.to_dict() for s in syllabi],
-            'count': len(syllabi)
-        }), 200
+        # Plain column rows skip ORM hydration and identity-map bookkeeping
+        rows = db.session.execute(
+            select(*Syllabus.__table__.columns)
+            .where(Syllabus.user_id == request.user_id)
+            .execution_options(yield_per=SYLLABUS_LIST_BATCH_SIZE)
+        )
+        # Read and serialize the first batch before the response starts, so a
+        # failing query still comes back as a 500 from the handler below
+        first_batch = [Syllabus.row_to_json(row) for row in rows.fetchmany(SYLLABUS_LIST_BATCH_SIZE)]
+        
+        # Stream the rest as rows come off the cursor, splicing each row's
+        # cached JSON; the count trails the array so nothing is buffered.
+        # Once the 200 is sent an error can only end the stream early: the
+        # body is then left without its closing '],"count":N}', so it never
+        # parses as JSON and clients treat it as a failed request.
+        def generate():
+            count = len(first_batch)
+            yield b'{"syllabi":[' + b','.join(first_batch)
+            try:
+                for syllabus in rows:
+                    yield (b',' if count else b'') + Syllabus.row_to_json(syllabus)
+                    count += 1
+            except Exception:
+                logger.exception(f"❌ ERROR streaming list_syllabi after {count} syllabi")
+                return
+            yield b'],"count":%d}' % count
+        
+        return Response(stream_with_context(generate()), mimetype='application/json'), 200
     except Exception as e:
-        print(f"❌ ERROR in list_syllabi: {str(e)}")
+        logger.error(f"❌ ERROR in list_syllabi: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/syllabus/<int:syllabus_id>', methods=['GET'])
@@ -166,14 +512,14 @@ def list_syllabi():
 def get_syllabus(syllabus_id):
     """Get a specific syllabus for the authenticated user."""
     try:
-        syllabus = Syllabus.query.filter_by(id=syllabus_id, user_id=request.user_id).first()
+        syllabus = get_owned_syllabus(syllabus_id, request.user_id)
         
         if not syllabus:
             return jsonify({'error': 'Syllabus not found'}), 404
         
-        return jsonify(syllabus.to_dict()), 200
+        return Response(syllabus.to_json(), mimetype='application/json'), 200
     except Exception as e:
-        print(f"❌ ERROR in get_syllabus: {str(e)}")
+        logger.error(f"❌ ERROR in get_syllabus: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/syllabus/<int:syllabus_id>', methods=['DELETE'])
@@ -181,18 +527,31 @@ def get_syllabus(syllabus_id):
 def delete_syllabus(syllabus_id):
     """Delete a syllabus for the authenticated user."""
     try:
-        syllabus = Syllabus.query.filter_by(id=syllabus_id, user_id=request.user_id).first()
+        # One DELETE ... RETURNING instead of a SELECT followed by a DELETE
+        course_id = db.session.execute(
+            delete(Syllabus)
+            .where(Syllabus.id == syllabus_id, Syllabus.user_id == request.user_id)
+            .returning(Syllabus.course_id)
+        ).scalar_one_or_none()
+        db.session.commit()
         
-        if not syllabus:
+        if course_id is None:
             return jsonify({'error': 'Syllabus not found'}), 404
         
-        db.session.delete(syllabus)
-        db.session.commit()
+        # Answers built from the deleted syllabus must not be served again
+        semantic_cache.clear(request.user_id)
+        
+        # Vectors are keyed by course, so only drop them once no syllabus uses it
+        still_used = db.session.execute(
+            select(Syllabus.id).where(Syllabus.course_id == course_id).limit(1)
+        ).first()
+        if not still_used:
+            pinecone_manager.delete_course_content(course_id)
         
         return jsonify({'message': 'Syllabus deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"❌ ERROR in delete_syllabus: {str(e)}")
+        logger.error(f"❌ ERROR in delete_syllabus: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/syllabus/<int:syllabus_id>/grading', methods=['PUT'])
@@ -200,13 +559,10 @@ def delete_syllabus(syllabus_id):
 def update_syllabus_grading(syllabus_id):
     """Update grading breakdown for a syllabus"""
     try:
-        from models import Syllabus, db, User
-        
-        user = User.query.get(request.user_id)
-        if not user:
+        if not user_exists(request.user_id):
             return jsonify({'error': 'User not found'}), 404
         
-        syllabus = Syllabus.query.filter_by(id=syllabus_id, user_id=request.user_id).first()
+        syllabus = get_owned_syllabus(syllabus_id, request.user_id)
         if not syllabus:
             return jsonify({'error': 'Syllabus not found'}), 404
         
@@ -217,6 +573,7 @@ def update_syllabus_grading(syllabus_id):
         if not isinstance(grading_breakdown, list):
             return jsonify({'error': 'gradingBreakdown must be an array'}), 400
         
+        # One pass validates, converts and totals each item, reporting the first bad one
         total_weight = 0
         for item in grading_breakdown:
             if not isinstance(item, dict) or 'category' not in item or 'weight' not in item:
@@ -224,15 +581,16 @@ def update_syllabus_grading(syllabus_id):
             
             try:
                 weight = float(item['weight'])
-                if weight < 0 or weight > 100:
-                    return jsonify({'error': f"Weight must be between 0 and 100, got {weight}"}), 400
-                total_weight += weight
             except (ValueError, TypeError):
                 return jsonify({'error': f"Invalid weight value: {item['weight']}"}), 400
+            if weight < 0 or weight > 100:
+                return jsonify({'error': f"Weight must be between 0 and 100, got {weight}"}), 400
+            total_weight += weight
         
         # Update syllabus
         syllabus.grading_breakdown = grading_breakdown
         db.session.commit()
+        semantic_cache.clear(request.user_id)
         
         logger.info(f"✅ Updated grading breakdown for syllabus {syllabus_id}")
         logger.info(f"   Total weight: {total_weight}% across {len(grading_breakdown)} categories")
@@ -269,7 +627,7 @@ def ask_rev():
         }), 200
         
     except Exception as e:
-        print(f"❌ ERROR in ask_rev: {str(e)}")
+        logger.error(f"❌ ERROR in ask_rev: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ask-rev/generate-worksheet', methods=['POST'])
@@ -277,9 +635,6 @@ def ask_rev():
 def generate_worksheet():
     """Generate a practice worksheet using OpenAI"""
     try:
-        from utils.openai import query_syllabus_content
-        from models import User, Syllabus
-        
         data = request.get_json()
         topic = data.get('topic', 'General Review')
         difficulty = data.get('difficulty', 'medium')
@@ -287,15 +642,13 @@ def generate_worksheet():
         course_id = data.get('courseId')
         
         user_id = request.user_id
-        user = User.query.get(user_id)
-        
-        if not user:
+        if not user_exists(user_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Get relevant syllabus content for context
         syllabus_context = ""
         if course_id:
-            syllabus = Syllabus.query.filter_by(user_id=user_id, id=course_id).first()
+            syllabus = get_owned_syllabus(course_id, user_id)
             if syllabus:
                 syllabus_context = f"\nCourse: {syllabus.course_name}\nTopics covered: {', '.join(syllabus.topics or [])}"
         else:
@@ -306,8 +659,6 @@ def generate_worksheet():
                 syllabus_context = "\nAvailable courses:\n" + "\n".join(courses[:3])
         
         # Use OpenAI to generate worksheet
-        from utils.openai import client
-        
         prompt = f"""Generate a {difficulty} difficulty practice worksheet with {num_questions} questions on the topic: "{topic}"
         
 {syllabus_context}
@@ -336,25 +687,21 @@ Make sure questions are:
 - Based on concepts from the syllabi when available
 - Clear and well-structured"""
 
+        messages = [
+            WORKSHEET_SYSTEM_MESSAGE,
+            {"role": "user", "content": prompt}
+        ]
+        wait_for_chat_budget(messages)
         response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educator creating practice worksheets."},
-                {"role": "user", "content": prompt}
-            ],
+            model="gpt-4o",
+            messages=messages,
+            response_format={"type": "json_object"},
             temperature=0.7
         )
         
         try:
             worksheet_text = response.choices[0].message.content
-            # Extract JSON from response
-            import json
-            import re
-            json_match = re.search(r'\{.*\}', worksheet_text, re.DOTALL)
-            if json_match:
-                worksheet = json.loads(json_match.group())
-            else:
-                worksheet = json.loads(worksheet_text)
+            worksheet = orjson.loads(worksheet_text)
         except:
             worksheet = {
                 "title": f"{topic} Practice Worksheet",
@@ -374,9 +721,6 @@ Make sure questions are:
 def generate_study_plan():
     """Generate a personalized study plan using OpenAI"""
     try:
-        from utils.openai import client
-        from models import User, Syllabus
-        
         data = request.get_json()
         course_id = data.get('courseId')
         course_name = data.get('courseName', 'the course')
@@ -384,15 +728,13 @@ def generate_study_plan():
         current_topics = data.get('currentTopics', [])
         
         user_id = request.user_id
-        user = User.query.get(user_id)
-        
-        if not user:
+        if not user_exists(user_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Get syllabus for this course
         syllabus_context = ""
         if course_id:
-            syllabus = Syllabus.query.filter_by(user_id=user_id, id=course_id).first()
+            syllabus = get_owned_syllabus(course_id, user_id)
             if syllabus:
                 syllabus_context = f"""
 Course Information:
@@ -443,24 +785,21 @@ Please provide a comprehensive study plan in JSON format:
   ]
 }}"""
 
+        messages = [
+            STUDY_PLAN_SYSTEM_MESSAGE,
+            {"role": "user", "content": prompt}
+        ]
+        wait_for_chat_budget(messages)
         response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert academic advisor creating personalized study plans."},
-                {"role": "user", "content": prompt}
-            ],
+            model="gpt-4o",
+            messages=messages,
+            response_format={"type": "json_object"},
             temperature=0.7
         )
         
         try:
             plan_text = response.choices[0].message.content
-            import json
-            import re
-            json_match = re.search(r'\{.*\}', plan_text, re.DOTALL)
-            if json_match:
-                study_plan = json.loads(json_match.group())
-            else:
-                study_plan = json.loads(plan_text)
+            study_plan = orjson.loads(plan_text)
         except:
             study_plan = {
                 "courseName": course_name,
@@ -476,17 +815,67 @@ Please provide a comprehensive study plan in JSON format:
         logger.error(f'Error generating study plan: {e}')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/ask-rev/campus-recommendations', methods=['GET'])
-@require_auth
-def get_campus_recommendations():
-    """Get Texas A&M campus recommendations using OpenAI"""
+@lru_cache(maxsize=1)
+def load_google_client_config() -> dict:
+    """Read the Google OAuth client secrets once; a missing file is retried on the next call."""
+    with open(GOOGLE_CREDENTIALS_PATH, 'rb') as f:
+        return orjson.loads(f.read())
+
+def google_calendar_token(user):
+    """Return the user's Google access token, refreshing and saving it first if it is about to expire.
+
+    Falls back to the stored token if it can't be refreshed, so callers behave
+    as before (the Calendar API call fails and the user reconnects).
+    """
+    token = user.google_calendar_token
+    expiry = user.google_calendar_token_expiry
+    if not token or not user.google_calendar_refresh_token or expiry is None:
+        return token
+    if expiry - GOOGLE_TOKEN_REFRESH_MARGIN > datetime.utcnow():
+        return token
+    
     try:
-        from utils.openai import client
-        
-        category = request.args.get('category', 'explore')
-        preferences = request.args.get('preferences', '')
-        
-        prompt = f"""Provide recommendations for the best places at Texas A&M University for {category} as though you are a student who has explored all over campus and College Station in general.
+        config = load_google_client_config()
+        client_config = config.get('web') or config['installed']
+        credentials = Credentials(
+            token=token,
+            refresh_token=user.google_calendar_refresh_token,
+            token_uri=client_config.get('token_uri', 'https://oauth2.googleapis.com/token'),
+            client_id=client_config['client_id'],
+            client_secret=client_config['client_secret'],
+            scopes=GOOGLE_OAUTH_SCOPES
+        )
+        credentials.refresh(Request())
+    except Exception as e:
+        logger.warning(f"⚠️ Could not refresh Google token for user {user.id}: {e}")
+        return token
+    
+    # Google keeps the refresh token; only the access token and expiry change.
+    # Save them on a separate connection rather than committing the request's
+    # session, which would expire the caller's eagerly loaded user and syllabi;
+    # the loaded user gets the new values without being marked dirty.
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(User).where(User.id == user.id)
+                .values(google_calendar_token=credentials.token, google_calendar_token_expiry=credentials.expiry)
+            )
+    except Exception as e:
+        # The fresh token still works for this request; the next one refreshes again
+        logger.warning(f"⚠️ Could not save refreshed Google token for user {user.id}: {e}")
+    set_committed_value(user, 'google_calendar_token', credentials.token)
+    set_committed_value(user, 'google_calendar_token_expiry', credentials.expiry)
+    logger.info(f"🔄 Refreshed Google token for user {user.id}")
+    return credentials.token
+
+@lru_cache(maxsize=256)
+def fetch_campus_recommendations(category: str, preferences: str, day: int) -> bytes:
+    """Ask OpenAI for campus recommendations, memoized per (category, preferences) for the day.
+
+    Returns the serialized response body. Raises ValueError on an unparseable
+    reply so failures are never cached.
+    """
+    prompt = f"""Provide recommendations for the best places at Texas A&M University for {category} as though you are a student who has explored all over campus and College Station in general.
 Additional preferences: {preferences if preferences else 'None'}
 
 Please provide realistic, accurate recommendations based on actual Texas A&M locations in this JSON format:
@@ -507,45 +896,97 @@ Please provide realistic, accurate recommendations based on actual Texas A&M loc
   ]
 }}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a knowledgeable Texas A&M student guide providing accurate campus recommendations."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
+    messages = [
+        CAMPUS_SYSTEM_MESSAGE,
+        {"role": "user", "content": prompt}
+    ]
+    wait_for_chat_budget(messages)
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=messages,
+        response_format={"type": "json_object"},
+        temperature=0.7
+    )
+    
+    parsed = orjson.loads(response.choices[0].message.content or '')
+    if not isinstance(parsed, dict):
+        raise ValueError(f"Expected a JSON object, got {type(parsed).__name__}")
+    recommendations = parsed.get('recommendations', [])
+    return orjson.dumps({'recommendations': recommendations})
+
+@app.route('/api/ask-rev/campus-recommendations', methods=['GET'])
+@require_auth
+def get_campus_recommendations():
+    """Get Texas A&M campus recommendations using OpenAI"""
+    try:
+        category = request.args.get('category', 'explore')
+        preferences = request.args.get('preferences', '')
         
         try:
-            rec_text = response.choices[0].message.content
-            import json
-            import re
-            json_match = re.search(r'\{.*\}', rec_text, re.DOTALL)
-            if json_match:
-                recommendations_data = json.loads(json_match.group())
-                recommendations = recommendations_data.get('recommendations', [])
-            else:
-                recommendations_data = json.loads(rec_text)
-                recommendations = recommendations_data.get('recommendations', [])
-        except:
-            recommendations = []
-        
-        return jsonify({'recommendations': recommendations}), 200
+            body = fetch_campus_recommendations(category, preferences, int(time.time() // CAMPUS_RECOMMENDATIONS_TTL))
+        except ValueError:
+            return jsonify({'recommendations': []}), 200
+        
+        response = Response(body, mimetype='application/json')
+        # Recommendations aren't user-specific, so browsers and CDNs may reuse them too
+        response.headers['Cache-Control'] = f'public, max-age={CAMPUS_RECOMMENDATIONS_TTL}'
+        return response, 200
     except Exception as e:
         logger.error(f'Error getting campus recommendations: {e}')
         return jsonify({'error': str(e)}), 500
 
+def build_calendar_context(token: str, calendar_id: str) -> str:
+    """Describe this week's Google Calendar events for the ask-question prompt."""
+    try:
+        # Start the week at midnight so every request this week asks for (and caches) the same window
+        today = datetime.now(CENTRAL_TZ)
+        week_start = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        week_end = week_start + timedelta(days=7)
+        
+        logger.info(f"🗓️ Fetching Google Calendar events for week: {week_start.date()} to {week_end.date()}")
+        
+        calendar_events = GoogleCalendarManager.get_week_events_from_calendar(
+            token,
+            calendar_id,
+            week_start,
+            week_end
+        )
+        
+        if not calendar_events:
+            return "\n(No Google Calendar events found for this week)\n"
+        
+        parts = ["\n🗓️ YOUR GOOGLE CALENDAR THIS WEEK:\n", "="*50 + "\n"]
+        for event in calendar_events:
+            title = event.get('title', 'Event')
+            start = event.get('start', 'No time specified')
+            location = event.get('location', '')
+            
+            parts.append(f"\n  📌 {title}\n")
+            parts.append(f"     Time: {start}\n")
+            if location:
+                parts.append(f"     Location: {location}\n")
+        
+        logger.info(f"✅ Found {len(calendar_events)} calendar events")
+        return "".join(parts)
+    except Exception as e:
+        logger.debug(f"Could not fetch Google Calendar events: {e}")
+        return f"\n(Could not fetch Google Calendar: {str(e)})\n"
+
+def build_semantic_context(question: str, user_id: int) -> str:
+    """Pull the course content most relevant to the question from Pinecone."""
+    try:
+        search_results = query_syllabus_content(question, None, user_id)
+        if search_results:
+            return f"\n\n📋 RELEVANT COURSE CONTENT:\n{'='*50}\n{search_results}"
+    except Exception as e:
+        logger.debug(f"Semantic search error: {e}")
+    return ""
+
 @app.route('/api/ask-rev/ask-question', methods=['POST'])
 @require_auth
 def ask_question():
     """Answer any question using OpenAI, with context from syllabi and Google Calendar for schedule questions"""
     try:
-        from utils.openai import client, query_syllabus_content
-        from utils.google_calendar import GoogleCalendarManager
-        from models import User, Syllabus
-        from datetime import datetime, timedelta
-        import pytz
-        
         data = request.get_json()
         question = data.get('question', '')
         
@@ -553,118 +994,70 @@ def ask_question():
             return jsonify({'error': 'Question required'}), 400
         
         user_id = request.user_id
-        user = User.query.get(user_id)
+        user = get_user_with_syllabi(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Detect if this is a calendar/schedule question
-        calendar_keywords = ['calendar', 'schedule', 'when', 'date', 'time', 'exam', 'quiz', 
-                           'assignment', 'due', 'deadline', 'meeting', 'class', 'week', 
-                           'today', 'tomorrow', 'next', 'busy', 'free', 'available']
-        is_calendar_question = any(keyword in question.lower() for keyword in calendar_keywords)
+        is_calendar_question = bool(CALENDAR_QUESTION_RE.search(question))
+        
+        # The calendar fetch and semantic search are independent network calls;
+        # run them alongside each other while the syllabus context is built here
+        calendar_future = None
+        if is_calendar_question and user.google_calendar_token:
+            calendar_future = context_executor.submit(
+                build_calendar_context, google_calendar_token(user), user.selected_calendar_id or 'primary'
+            )
+        semantic_future = context_executor.submit(build_semantic_context, question, user_id)
         
-        # Get all syllabi for the user
-        syllabi = Syllabus.query.filter_by(user_id=user_id).all()
+        # Syllabi were loaded together with the user
+        syllabi = user.syllabi
         
         # Build comprehensive syllabus context with course names
         syllabi_content = ""
         if syllabi:
-            syllabi_context = "\n📚 COURSE INFORMATION:\n"
-            syllabi_context += "="*50 + "\n"
+            parts = ["\n📚 COURSE INFORMATION:\n", "="*50 + "\n"]
             
             for syllabus in syllabi:
-                syllabi_context += f"\n📖 {syllabus.course_name}"
+                parts.append(f"\n📖 {syllabus.course_name}")
                 if syllabus.instructor:
-                    syllabi_context += f" (Instructor: {syllabus.instructor})"
-                syllabi_context += "\n"
+                    parts.append(f" (Instructor: {syllabus.instructor})")
+                parts.append("\n")
                 
                 if syllabus.topics:
-                    syllabi_context += f"  Topics: {', '.join(syllabus.topics)}\n"
+                    parts.append(f"  Topics: {', '.join(syllabus.topics)}\n")
                 
                 # Include key dates with FULL course context
                 if syllabus.key_dates and is_calendar_question:
-                    syllabi_context += f"  📅 Key Dates:\n"
-                    for date_entry in syllabus.key_dates:
-                        if isinstance(date_entry, dict):
-                            date_str = date_entry.get('date', '')
-                            event = date_entry.get('event', date_entry.get('title', 'Event'))
-                            event_type = date_entry.get('type', 'assignment')
-                            # IMPORTANT: Always include course name with event
-                            syllabi_context += f"    - [{syllabus.course_name}] {event} ({event_type}): {date_str}\n"
-                        else:
-                            syllabi_context += f"    - [{syllabus.course_name}] {str(date_entry)}\n"
+                    parts.append("  📅 Key Dates:\n")
+                    # IMPORTANT: Always include course name with event
+                    course_name = syllabus.course_name
+                    parts.extend(
+                        KEY_DATE_LINE.format(
+                            course=course_name,
+                            event=d.get('event', d.get('title', 'Event')),
+                            type=d.get('type', 'assignment'),
+                            date=d.get('date', '')
+                        ) if isinstance(d, dict) else f"    - [{course_name}] {d}\n"
+                        for d in syllabus.key_dates
+                    )
                 
                 if syllabus.grading_breakdown:
                     if isinstance(syllabus.grading_breakdown, list) and syllabus.grading_breakdown:
-                        grading_items = []
-                        for item in syllabus.grading_breakdown:
-                            cat = item.get('category', 'Unknown')
-                            weight = item.get('weight', 0)
-                            grading_items.append(f"{cat}: {weight}%")
-                        syllabi_context += f"  📊 Grading: {', '.join(grading_items)}\n"
-            syllabi_content = syllabi_context
-        
-        # For calendar/schedule questions, fetch Google Calendar events
-        google_calendar_context = ""
-        if is_calendar_question and hasattr(user, 'google_calendar_token') and user.google_calendar_token:
-            try:
-                central = pytz.timezone('America/Chicago')
-                today = datetime.now(central)
-                week_start = today - timedelta(days=today.weekday())
-                week_end = week_start + timedelta(days=7)
-                
-                logger.info(f"🗓️ Fetching Google Calendar events for week: {week_start.date()} to {week_end.date()}")
-                
-                # Use selected calendar or default to 'primary'
-                calendar_id = user.selected_calendar_id or 'primary'
-                calendar_events = GoogleCalendarManager.get_week_events_from_calendar(
-                    user.google_calendar_token,
-                    calendar_id,
-                    week_start,
-                    week_end
-                )
-                
-                if calendar_events:
-                    google_calendar_context = "\n🗓️ YOUR GOOGLE CALENDAR THIS WEEK:\n"
-                    google_calendar_context += "="*50 + "\n"
-                    for event in calendar_events:
-                        title = event.get('title', 'Event')
-                        start = event.get('start', 'No time specified')
-                        location = event.get('location', '')
-                        
-                        google_calendar_context += f"\n  📌 {title}\n"
-                        google_calendar_context += f"     Time: {start}\n"
-                        if location:
-                            google_calendar_context += f"     Location: {location}\n"
-                    
-                    logger.info(f"✅ Found {len(calendar_events)} calendar events")
-                else:
-                    google_calendar_context = "\n(No Google Calendar events found for this week)\n"
-            except Exception as e:
-                logger.debug(f"Could not fetch Google Calendar events: {e}")
-                google_calendar_context = f"\n(Could not fetch Google Calendar: {str(e)})\n"
+                        grading_items = ", ".join(
+                            f"{item.get('category', 'Unknown')}: {item.get('weight', 0)}%"
+                            for item in syllabus.grading_breakdown
+                        )
+                        parts.append(f"  📊 Grading: {grading_items}\n")
+            syllabi_content = "".join(parts)
         
-        # Try to get more specific content using semantic search
-        semantic_context = ""
-        try:
-            search_results = query_syllabus_content(question, None, user_id)
-            if search_results:
-                semantic_context = f"\n\n📋 RELEVANT COURSE CONTENT:\n"
-                semantic_context += "="*50 + "\n"
-                semantic_context += f"{search_results}"
-        except Exception as e:
-            logger.debug(f"Semantic search error: {e}")
+        # Wait for the calendar and semantic lookups started above
+        google_calendar_context = calendar_future.result() if calendar_future else ""
+        semantic_context = semantic_future.result()
         
         # Build the comprehensive prompt
-        prompt = f"""You are Rev, an AI study assistant at Texas A&M University.
-
-IMPORTANT RULES:
-1. When mentioning ANY assignment, exam, quiz, homework, or deadline - ALWAYS specify which course/class it belongs to
-2. Use the course information provided below as context
-3. For schedule questions, use BOTH the Google Calendar events AND the syllabus key dates
-4. Provide accurate dates and times
-5. Be specific and actionable
+        prompt = f"""{ASK_QUESTION_RULES}
 
 Question: {question}
 
@@ -674,30 +1067,16 @@ Question: {question}
 
 {semantic_context}
 
-Provide a clear, helpful answer that:
-1. Directly addresses the question
-2. When mentioning assignments/exams/quizzes, ALWAYS include the course name (e.g., "CSCE 314 Midterm")
-3. Uses calendar and syllabus information when relevant
-4. For schedule questions, reference specific dates from calendar or syllabi
-5. Provides actionable advice
-6. Suggests follow-up actions when appropriate"""
+{ASK_QUESTION_INSTRUCTIONS}"""
 
+        messages = [
+            ASK_QUESTION_SYSTEM_MESSAGE,
+            {"role": "user", "content": prompt}
+        ]
+        wait_for_chat_budget(messages, 2000)
         response = client.chat.completions.create(
             model="gpt-4",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": """You are Rev, a knowledgeable and detailed AI study assistant at Texas A&M University.
-                    
-CRITICAL: When discussing ANY assignment, exam, quiz, homework, or deadline:
-- ALWAYS mention which course/class it belongs to
-- ALWAYS include the course code if available (e.g., CSCE 314, MATH 251)
-- Format as: "[COURSE NAME] Assignment Name"
-
-Be specific, helpful, and organized. Use the student's calendar and syllabus data extensively."""
-                },
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             temperature=0.7,
             max_tokens=2000
         )
@@ -716,8 +1095,6 @@ Be specific, helpful, and organized. Use the student's calendar and syllabus dat
 def create_plaid_link_token():
     """Create a Plaid Link token for account connection"""
     try:
-        from utils.plaid import PlaidManager
-        
         user_id = request.user_id
         result = PlaidManager.create_link_token(user_id)
         
@@ -734,9 +1111,6 @@ def create_plaid_link_token():
 def exchange_plaid_token():
     """Exchange public token for access token and save to user profile"""
     try:
-        from utils.plaid import PlaidManager
-        from models import db, User
-        
         user_id = request.user_id
         data = request.get_json()
         public_token = data.get('public_token')
@@ -747,15 +1121,16 @@ def exchange_plaid_token():
         
         # Exchange token
         result = PlaidManager.exchange_public_token(public_token, metadata)
-        
-        # TODO: Save access_token to user profile or separate table
-        # This should be encrypted and stored securely
-        user = User.query.get(user_id)
-        if user:
-            # Store plaid_access_token (should be encrypted in production)
-            user.plaid_access_token = result['access_token']
-            user.plaid_item_id = result['item_id']
-            db.session.commit()
+        PlaidManager.forget_link_token(user_id)
+        
+        # A new item starts a fresh sync; drop the previous item's transactions
+        db.session.execute(delete(PlaidTransaction).where(PlaidTransaction.user_id == user_id))
+        update_user(
+            user_id,
+            plaid_access_token=PlaidManager.encrypt_access_token(result['access_token']),
+            plaid_item_id=result['item_id'],
+            plaid_sync_cursor=None
+        )
         
         return jsonify({
             'success': True,
@@ -771,17 +1146,13 @@ def exchange_plaid_token():
 def get_plaid_accounts():
     """Get list of linked bank accounts"""
     try:
-        from utils.plaid import PlaidManager
-        from models import User
-        
         user_id = request.user_id
-        user = User.query.get(user_id)
+        access_token = get_plaid_access_token(user_id)
         
-        if not user or not hasattr(user, 'plaid_access_token') or not user.plaid_access_token:
+        if not access_token:
             return jsonify({'error': 'No Plaid account linked'}), 404
         
-        # TODO: Decrypt access token in production
-        accounts = PlaidManager.get_accounts(user.plaid_access_token)
+        accounts = PlaidManager.get_accounts(access_token)
         
         return jsonify({
             'accounts': accounts
@@ -795,9 +1166,6 @@ def get_plaid_accounts():
 def get_plaid_transactions():
     """Get transactions for linked bank accounts"""
     try:
-        from utils.plaid import PlaidManager
-        from models import User
-        
         user_id = request.user_id
         
         # Get access_token from query parameters or request body
@@ -834,17 +1202,28 @@ def get_plaid_transactions():
 def get_spending_insights():
     """Get spending analysis and insights"""
     try:
-        from utils.plaid import PlaidManager
-        from models import User
-        
         user_id = request.user_id
-        user = User.query.get(user_id)
+        access_token = get_plaid_access_token(user_id)
         
-        if not user or not hasattr(user, 'plaid_access_token') or not user.plaid_access_token:
+        if not access_token:
             return jsonify({'error': 'No Plaid account linked'}), 404
         
-        # TODO: Decrypt access token in production
-        insights = PlaidManager.get_insights(user.plaid_access_token)
+        # Pull only what changed since the last visit, then read the window locally
+        sync_plaid_transactions(user_id, access_token)
+        today = date.today()
+        start = today - timedelta(days=90)
+        # Only the columns the aggregate reads, streamed into it row by row
+        rows = db.session.execute(
+            select(PlaidTransaction.category, PlaidTransaction.amount).where(
+                PlaidTransaction.user_id == user_id,
+                PlaidTransaction.date >= start,
+                PlaidTransaction.date <= today
+            )
+        )
+        insights = PlaidManager.build_insights(
+            ({'category': row.category, 'amount': row.amount} for row in rows),
+            start.isoformat(), today.isoformat()
+        )
         
         return jsonify(insights), 200
     except Exception as e:
@@ -856,17 +1235,18 @@ def get_spending_insights():
 def get_recurring_transactions():
     """Get recurring transactions (subscriptions, etc.)"""
     try:
-        from utils.plaid import PlaidManager
-        from models import User
-        
         user_id = request.user_id
-        user = User.query.get(user_id)
+        access_token = get_plaid_access_token(user_id)
         
-        if not user or not hasattr(user, 'plaid_access_token') or not user.plaid_access_token:
+        if not access_token:
             return jsonify({'error': 'No Plaid account linked'}), 404
         
-        # TODO: Decrypt access token in production
-        recurring = PlaidManager.get_recurring_transactions(user.plaid_access_token)
+        try:
+            recurring = PlaidManager.get_recurring_transactions(access_token)
+        except ApiException as e:
+            # Recurring transactions may not be available in all environments
+            logger.warning(f"Recurring transactions not available: {e.status} {e.reason}")
+            recurring = []
         
         return jsonify({
             'recurring_transactions': recurring,
@@ -876,176 +1256,324 @@ def get_recurring_transactions():
         logger.error(f'Error getting recurring transactions: {e}')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/weekly-advisor', methods=['GET'])
-@require_auth
-def weekly_advisor():
-    """Get weekly advisor review with calendar events and assignments"""
+# Keywords to identify different types of assignments, in priority order
+ASSIGNMENT_KEYWORDS = {
+    'exam': ['exam', 'midterm', 'final', 'quiz', 'test'],
+    'homework': ['hw', 'homework', 'assignment', 'problem set', 'ps', 'pset', 'worksheet'],
+    'lab': ['lab', 'laboratory', 'practical', 'experiment'],
+    'project': ['project', 'capstone', 'presentation', 'milestone', 'proposal'],
+    'activity': ['activity', 'activities', 'exercise', 'exercises', 'discussion', 'workshop', 'seminar'],
+    'reading': ['reading', 'readings', 'chapter', 'ch ', 'ch.', 'part ', 'textbook', 'section'],
+    'submission': ['submit', 'submission', 'deliverable', 'artifact', 'report']
+}
+
+def _keyword_re(keywords) -> re.Pattern:
+    """Compile a keyword list into one case-insensitive substring matcher."""
+    return re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+
+# Parsed key dates keyed by syllabus id -> (updated_at, entries, days). Every
+# write to a syllabus bumps updated_at, which invalidates its entry.
+PARSED_KEY_DATES_CACHE_SIZE = 4096
+_parsed_key_dates_cache = OrderedDict()
+_parsed_key_dates_lock = threading.Lock()
+
+# One compiled matcher per type, tried in ASSIGNMENT_KEYWORDS order
+ASSIGNMENT_TYPE_PATTERNS = [(assign_type, _keyword_re(keywords)) for assign_type, keywords in ASSIGNMENT_KEYWORDS.items()]
+READING_TITLE_RE = _keyword_re(['ch ', 'ch.', 'chapter ', 'reading'])
+SUBMISSION_TITLE_RE = _keyword_re(['due', 'submit', 'deadline', 'due date'])
+
+def classify_assignment_type(title: str, event_type: str) -> str:
+    """Classify assignment based on title and type - looks for specific keywords"""
+    type_lower = event_type.lower() if event_type else ''
+    
+    # First check explicit type if it's a known type
+    if type_lower in ASSIGNMENT_KEYWORDS:
+        return type_lower
+    
+    # Check for chapter/reading patterns (e.g., "Ch 5", "Chapter 3.2", "Ch 5 Part 1")
+    if READING_TITLE_RE.search(title):
+        return 'reading'
+    
+    # Check title keywords - prioritize more specific matches first
+    for assign_type, pattern in ASSIGNMENT_TYPE_PATTERNS:
+        if pattern.search(title):
+            return assign_type
+    
+    # If it contains 'due' or assignment-like language, treat as assignment
+    if SUBMISSION_TITLE_RE.search(title):
+        return 'submission'
+    
+    # Default to 'homework' if we think it's an assignment
+    return 'homework'
+
+def calculate_priority(event_type: str, days_until: int) -> str:
+    """Calculate priority based on assignment type and how soon it's due"""
+    # High priority for exams
+    if event_type in ['exam']:
+        return 'high'
+    # High priority for things due soon
+    if days_until <= 1:
+        return 'high'
+    if days_until <= 3:
+        return 'high'
+    if days_until <= 7:
+        return 'medium'
+    return 'low'
+
+def parse_event_date(date_str: str) -> datetime:
+    """Parse a key date, building plain YYYY-MM-DD dates directly instead of via the ISO parser."""
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        return datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10]))
+    # Handle both full ISO timestamps and loosely padded dates
     try:
-        from utils.openai import client
-        from models import User, Syllabus
-        from datetime import datetime, timedelta
-        import pytz
-        
-        user_id = request.user_id
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Get current week dates in Central Time (Texas A&M timezone)
-        central = pytz.timezone('America/Chicago')
-        today = datetime.now(central).replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Week starts on Monday (weekday 0)
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=7)
-        
-        logger.info(f"📅 Weekly Advisor for week: {week_start.date()} to {week_end.date()}")
-        
-        # Collect all assignments from syllabi
-        syllabi = Syllabus.query.filter_by(user_id=user_id).all()
-        assignments = []
-        
-        # Keywords to identify different types of assignments
-        assignment_keywords = {
-            'exam': ['exam', 'midterm', 'final', 'quiz', 'test'],
-            'homework': ['hw', 'homework', 'assignment', 'problem set', 'ps', 'pset', 'worksheet'],
-            'lab': ['lab', 'laboratory', 'practical', 'experiment'],
-            'project': ['project', 'capstone', 'presentation', 'milestone', 'proposal'],
-            'activity': ['activity', 'activities', 'exercise', 'exercises', 'discussion', 'workshop', 'seminar'],
-            'reading': ['reading', 'readings', 'chapter', 'ch ', 'ch.', 'part ', 'textbook', 'section'],
-            'submission': ['submit', 'submission', 'deliverable', 'artifact', 'report']
-        }
-        
-        def classify_assignment_type(title: str, event_type: str) -> str:
-            """Classify assignment based on title and type - looks for specific keywords"""
-            title_lower = title.lower()
-            type_lower = event_type.lower() if event_type else ''
-            
-            # First check explicit type if it's a known type
-            if type_lower in assignment_keywords:
-                return type_lower
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        return datetime.strptime(date_str, '%Y-%m-%d')
+
+def parse_key_dates(syllabus) -> tuple:
+    """Parse, localize and classify a syllabus's key dates.
+
+    Returns (entries, days): (event_date, event_day, title, type) tuples sorted
+    by day then time, and the matching list of days for bisecting. The result is reused
+    until the syllabus's updated_at changes.
+    """
+    with _parsed_key_dates_lock:
+        cached = _parsed_key_dates_cache.get(syllabus.id)
+        if cached and cached[0] == syllabus.updated_at:
+            _parsed_key_dates_cache.move_to_end(syllabus.id)
+            return cached[1], cached[2]
+    
+    entries = []
+    for date_entry in syllabus.key_dates or []:
+        try:
+            if isinstance(date_entry, dict):
+                date_str = date_entry.get('date', '')
+            else:
+                date_str = str(date_entry)
             
-            # Check for chapter/reading patterns (e.g., "Ch 5", "Chapter 3.2", "Ch 5 Part 1")
-            if any(pattern in title_lower for pattern in ['ch ', 'ch.', 'chapter ', 'reading']):
-                return 'reading'
+            event_date = parse_event_date(date_str)
             
-            # Check title keywords - prioritize more specific matches first
-            for assign_type, keywords in assignment_keywords.items():
-                if any(keyword in title_lower for keyword in keywords):
-                    return assign_type
+            # Convert to Central Time if it's naive or UTC
+            if event_date.tzinfo is None:
+                event_date = event_date.replace(tzinfo=CENTRAL_TZ)
+            elif event_date.tzinfo.tzname(event_date) == 'UTC':
+                event_date = event_date.astimezone(CENTRAL_TZ)
             
-            # If it contains 'due' or assignment-like language, treat as assignment
-            if any(keyword in title_lower for keyword in ['due', 'submit', 'deadline', 'due date']):
-                return 'submission'
+            event_date_only = event_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            raw_type = date_entry.get('type', 'assignment') if isinstance(date_entry, dict) else 'assignment'
+            title = date_entry.get('event', date_entry.get('title', 'Assignment')) if isinstance(date_entry, dict) else str(date_entry)
             
-            # Default to 'homework' if we think it's an assignment
-            return 'homework'
-        
-        def calculate_priority(event_type: str, days_until: int) -> str:
-            """Calculate priority based on assignment type and how soon it's due"""
-            # High priority for exams
-            if event_type in ['exam']:
-                return 'high'
-            # High priority for things due soon
-            if days_until <= 1:
-                return 'high'
-            if days_until <= 3:
-                return 'high'
-            if days_until <= 7:
-                return 'medium'
-            return 'low'
-        
-        for syllabus in syllabi:
-            if syllabus.key_dates:
-                for date_entry in syllabus.key_dates:
-                    try:
-                        if isinstance(date_entry, dict):
-                            date_str = date_entry.get('date', '')
-                        else:
-                            date_str = str(date_entry)
-                        
-                        # Parse date - handle both ISO format and date-only format
-                        try:
-                            event_date = datetime.fromisoformat(date_str)
-                        except:
-                            event_date = datetime.strptime(date_str, '%Y-%m-%d')
-                        
-                        # Convert to Central Time if it's naive or UTC
-                        if event_date.tzinfo is None:
-                            event_date = central.localize(event_date)
-                        elif event_date.tzinfo.tzname(event_date) == 'UTC':
-                            event_date = event_date.astimezone(central)
-                        
-                        # Check if event is from today onwards (not just this week)
-                        event_date_only = event_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                        if event_date_only >= today:
-                            raw_type = date_entry.get('type', 'assignment') if isinstance(date_entry, dict) else 'assignment'
-                            title = date_entry.get('event', date_entry.get('title', 'Assignment')) if isinstance(date_entry, dict) else str(date_entry)
-                            
-                            # Classify the assignment type with comprehensive keyword matching
-                            classified_type = classify_assignment_type(title, raw_type)
-                            
-                            # Calculate priority based on type and days until due
-                            days_until = (event_date_only - today).days
-                            priority = calculate_priority(classified_type, days_until)
-                            
-                            assignments.append({
-                                'course': syllabus.course_name,
-                                'title': title,
-                                'date': event_date.isoformat(),
-                                'type': classified_type,
-                                'priority': priority
-                            })
-                            logger.info(f"  ✓ Found [{classified_type}]: {title} on {event_date.date()} (priority: {priority})")
-                    except (ValueError, AttributeError, TypeError) as e:
-                        logger.debug(f"  ⚠ Skipped entry: {str(e)}")
-                        continue
-        
-        # Get Google Calendar events if available (from today onwards)
-        calendar_events = []
-        if hasattr(user, 'google_calendar_token') and user.google_calendar_token:
-            try:
-                from utils.google_calendar import GoogleCalendarManager
-                # Use selected calendar or default to 'primary'
-                calendar_id = user.selected_calendar_id or 'primary'
-                # Fetch from today until far future (e.g., 90 days)
-                calendar_end = today + timedelta(days=90)
-                calendar_events = GoogleCalendarManager.get_week_events_from_calendar(
-                    user.google_calendar_token,
-                    calendar_id,
-                    today,
-                    calendar_end
-                )
-                logger.info(f"📅 Retrieved {len(calendar_events)} calendar events from {today.date()} onwards")
-            except Exception as e:
-                logger.warning(f"Could not fetch Google Calendar events: {e}")
-        
-        # If no calendar events, create synthetic ones from assignments
-        if not calendar_events:
-            calendar_events = [
-                {
-                    'title': a['title'],
-                    'start': a['date'],
-                    'end': a['date'],
-                    'description': f"For {a['course']}",
-                    'busy': True
-                }
-                for a in assignments
-            ]
-        
-        # Use OpenAI to generate weekly review
-        tasks_summary = "\n".join([
-            f"- {a['title']} ({a['course']}) - {a['date']} [{a['priority'].upper()}]"
-            for a in assignments
-        ])
-        
-        calendar_summary = "\n".join([
-            f"- {e['title']} - {e['start']}"
-            for e in calendar_events[:10]
-        ])
-        
-        prompt = f"""You are Rev, an academic advisor at Texas A&M University. Provide a comprehensive, well-formatted weekly review of this student's tasks and calendar.
+            # Classify the assignment type with comprehensive keyword matching
+            entries.append((event_date, event_date_only, title, classify_assignment_type(title, raw_type)))
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.debug("  ⚠ Skipped entry: %s", e)
+    
+    entries.sort(key=lambda entry: (entry[1], entry[0]))
+    days = [entry[1] for entry in entries]
+    
+    with _parsed_key_dates_lock:
+        _parsed_key_dates_cache[syllabus.id] = (syllabus.updated_at, entries, days)
+        _parsed_key_dates_cache.move_to_end(syllabus.id)
+        if len(_parsed_key_dates_cache) > PARSED_KEY_DATES_CACHE_SIZE:
+            _parsed_key_dates_cache.popitem(last=False)
+    return entries, days
+
+def upcoming_key_dates(syllabus, today: datetime) -> list:
+    """Return a syllabus's parsed key dates from today onwards, skipping past ones by bisection."""
+    entries, days = parse_key_dates(syllabus)
+    return entries[bisect_left(days, today):]
+
+def fetch_upcoming_calendar_events(token: str, calendar_id: str, start: datetime) -> list:
+    """Fetch the next 90 days of Google Calendar events for the weekly advisor."""
+    try:
+        calendar_events = GoogleCalendarManager.get_week_events_from_calendar(
+            token,
+            calendar_id,
+            start,
+            start + timedelta(days=90)
+        )
+        logger.info("📅 Retrieved %d calendar events from %s onwards", len(calendar_events), start.date())
+        return calendar_events
+    except Exception as e:
+        logger.warning(f"Could not fetch Google Calendar events: {e}")
+        return []
+
+def weekly_advisor_cache_key(user, today: datetime) -> str:
+    """Key a user's weekly review by day, calendar and the current state of their syllabi."""
+    fingerprint = hashlib.blake2b(digest_size=8)
+    for syllabus_id, updated_at in sorted((s.id, s.updated_at) for s in user.syllabi):
+        fingerprint.update(f"{syllabus_id}:{updated_at};".encode())
+    calendar_id = (user.selected_calendar_id or 'primary') if user.google_calendar_token else '-'
+    return f"wa:{user.id}:{today.date()}:{calendar_id}:{fingerprint.hexdigest()}"
+
+def get_cached_weekly_review(cache_key: str):
+    """Return the cached weekly advisor body, or None on a miss or if Redis is down."""
+    try:
+        return redis_conn.get(cache_key)
+    except Exception as e:
+        logger.warning(f"⚠️ Weekly review cache unavailable: {e}")
+        return None
+
+def cache_weekly_review(cache_key: str, body: bytes):
+    """Store a weekly advisor body for WEEKLY_ADVISOR_CACHE_TTL seconds."""
+    try:
+        redis_conn.setex(cache_key, WEEKLY_ADVISOR_CACHE_TTL, body)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not cache weekly review: {e}")
+
+def get_saved_weekly_review(user_id: int, today: datetime, cache_key: str):
+    """Return the precomputed weekly advisor body if it still matches cache_key, else None."""
+    week_start = (today - timedelta(days=today.weekday())).date()
+    return db.session.execute(
+        select(WeeklyReview.body).where(
+            WeeklyReview.user_id == user_id,
+            WeeklyReview.week_start == week_start,
+            WeeklyReview.cache_key == cache_key
+        )
+    ).scalar_one_or_none()
+
+def save_weekly_review(user_id: int, today: datetime, cache_key: str, payload: dict):
+    """Cache a finished weekly advisor body and keep it as the user's review for the week."""
+    body = orjson.dumps(payload)
+    cache_weekly_review(cache_key, body)
+    week_start = (today - timedelta(days=today.weekday())).date()
+    stmt = sqlite_insert(WeeklyReview).values(
+        user_id=user_id, week_start=week_start, cache_key=cache_key, body=body, generated_at=datetime.utcnow()
+    )
+    # Update from the proposed row so the clock is read and the body bound only once
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'week_start'],
+        set_={'cache_key': stmt.excluded.cache_key, 'body': stmt.excluded.body, 'generated_at': stmt.excluded.generated_at}
+    ))
+    db.session.commit()
+
+def sse_event(data, event: str = None) -> bytes:
+    """Encode one server-sent event carrying a JSON payload."""
+    prefix = b'event: ' + event.encode() + b'\n' if event else b''
+    return prefix + b'data: ' + orjson.dumps(data) + b'\n\n'
+
+def event_stream_response(events) -> Response:
+    """Wrap an event generator in an unbuffered text/event-stream response."""
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_weekly_review(user_id: int, today: datetime, cache_key: str, summary: dict, messages: list):
+    """Yield the weekly advisor as server-sent events: summary, review deltas, then done."""
+    yield sse_event(summary, 'summary')
+    try:
+        wait_for_chat_budget(messages, 800)
+        stream = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=800,
+            stream=True
+        )
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield sse_event({'delta': delta})
+        save_weekly_review(user_id, today, cache_key, {**summary, 'weeklyReview': ''.join(parts)})
+        yield sse_event({}, 'done')
+    except Exception as e:
+        logger.error(f'Error streaming weekly review: {e}')
+        yield sse_event({'error': str(e)}, 'error')
+
+def replay_weekly_review(cached: bytes):
+    """Yield a cached weekly advisor body as the same events stream_weekly_review sends."""
+    payload = orjson.loads(cached)
+    review = payload.pop('weeklyReview')
+    yield sse_event(payload, 'summary')
+    yield sse_event({'delta': review})
+    yield sse_event({}, 'done')
+
+def load_weekly_advisor_user(user_id: int):
+    """Load a user with just the columns the weekly advisor reads."""
+    # Only course names and key dates (plus updated_at for the parse cache)
+    # and the calendar settings are read below; skip every other column
+    return get_user_with_syllabi(
+        user_id, Syllabus.course_name, Syllabus.key_dates, Syllabus.updated_at,
+        user_columns=(User.google_calendar_token, User.google_calendar_refresh_token,
+                      User.google_calendar_token_expiry, User.selected_calendar_id)
+    )
+
+def central_today() -> datetime:
+    """Midnight today in Central Time (Texas A&M timezone)."""
+    return datetime.now(CENTRAL_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def build_weekly_advisor(user, today: datetime):
+    """Collect a user's upcoming assignments and events; returns (summary, OpenAI messages)."""
+    # Week starts on Monday (weekday 0)
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+    
+    logger.info("📅 Weekly Advisor for week: %s to %s", week_start.date(), week_end.date())
+    
+    # Start the Google Calendar fetch (from today onwards) now so it runs
+    # while the syllabi are parsed below
+    calendar_future = None
+    if user.google_calendar_token:
+        calendar_future = context_executor.submit(
+            fetch_upcoming_calendar_events, google_calendar_token(user), user.selected_calendar_id or 'primary', today
+        )
+    
+    # Collect all assignments from syllabi, building their prompt lines and
+    # stand-in calendar events in the same pass
+    syllabi = user.syllabi
+    assignments = []
+    task_lines = []
+    synthetic_events = []
+    
+    # Each syllabus's upcoming key dates are already sorted, so merging them
+    # yields every assignment in date order without sorting
+    upcoming = heapq.merge(
+        *([(entry, syllabus.course_name) for entry in upcoming_key_dates(syllabus, today)] for syllabus in syllabi),
+        key=lambda item: (item[0][1], item[0][0])
+    )
+    for (event_date, event_date_only, title, classified_type), course in upcoming:
+        # Calculate priority based on type and days until due
+        days_until = (event_date_only - today).days
+        priority = calculate_priority(classified_type, days_until)
+        due = event_date.isoformat()
+        
+        assignments.append({
+            'course': course,
+            'title': title,
+            'date': due,
+            'type': classified_type,
+            'priority': priority
+        })
+        task_lines.append(f"- {title} ({course}) - {due} [{priority.upper()}]")
+        synthetic_events.append({
+            'title': title,
+            'start': due,
+            'end': due,
+            'description': f"For {course}",
+            'busy': True
+        })
+        logger.debug("  ✓ Found [%s]: %s on %s (priority: %s)", classified_type, title, event_date.date(), priority)
+    
+    # Wait for the Google Calendar fetch started before the syllabus loop
+    calendar_events = calendar_future.result() if calendar_future else []
+    
+    # If no calendar events, use the synthetic ones built from assignments
+    if not calendar_events:
+        calendar_events = synthetic_events
+    
+    # Use OpenAI to generate weekly review
+    tasks_summary = "\n".join(task_lines)
+    
+    calendar_summary = "\n".join([
+        f"- {e['title']} - {e['start']}"
+        for e in calendar_events[:10]
+    ])
+    
+    prompt = f"""You are Rev, an academic advisor at Texas A&M University. Provide a comprehensive, well-formatted weekly review of this student's tasks and calendar.
 
 THIS WEEK: {week_start.strftime('%A, %B %d')} to {week_end.strftime('%A, %B %d, %Y')}
 
@@ -1093,31 +1621,84 @@ List the top 3-5 urgent items with:
 - Positive affirmations about their abilities
 - Quick tip for success
 
-Format clearly with headers, bullet points, and emojis for visual appeal. Keep the tone supportive and motivational."""
+Format clearly with headers, bullet points, and emojis for visual appeal. Keep the tone supportive and motivational, and keep the whole review under 500 words."""
+
+    messages = [
+        WEEKLY_ADVISOR_SYSTEM_MESSAGE,
+        {"role": "user", "content": prompt}
+    ]
+    summary = {
+        'today': today.isoformat(),
+        'weekStart': week_start.isoformat(),
+        'weekEnd': week_end.isoformat(),
+        'assignments': assignments,
+        'calendarEvents': calendar_events,
+        'courseCount': len(syllabi),
+        'assignmentCount': len(assignments),
+        'eventCount': len(calendar_events)
+    }
+    return summary, messages
+
+def generate_weekly_review(user, today: datetime, cache_key: str) -> dict:
+    """Ask OpenAI for the weekly review and save the finished response."""
+    summary, messages = build_weekly_advisor(user, today)
+    wait_for_chat_budget(messages, 800)
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=800
+    )
+    
+    payload = {**summary, 'weeklyReview': response.choices[0].message.content}
+    save_weekly_review(user.id, today, cache_key, payload)
+    return payload
+
+def precompute_weekly_review(user_id: int):
+    """Generate today's weekly review ahead of time unless an up-to-date one is saved."""
+    user = load_weekly_advisor_user(user_id)
+    if not user:
+        return
+    today = central_today()
+    cache_key = weekly_advisor_cache_key(user, today)
+    if get_saved_weekly_review(user_id, today, cache_key) is None:
+        generate_weekly_review(user, today, cache_key)
+        logger.info("✅ Precomputed weekly review for user %s", user_id)
 
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are Rev, a supportive and organized academic advisor. Always format responses clearly with markdown, headers, and bullet points. Be specific, actionable, and motivational."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
+@app.route('/api/weekly-advisor', methods=['GET'])
+@require_auth
+def weekly_advisor():
+    """Get weekly advisor review with calendar events and assignments"""
+    try:
+        user = load_weekly_advisor_user(request.user_id)
         
-        weekly_review = response.choices[0].message.content
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({
-            'today': today.isoformat(),
-            'weekStart': week_start.isoformat(),
-            'weekEnd': week_end.isoformat(),
-            'assignments': sorted(assignments, key=lambda a: a['date']),
-            'calendarEvents': sorted(calendar_events, key=lambda e: e.get('start', '')),
-            'weeklyReview': weekly_review,
-            'courseCount': len(syllabi),
-            'assignmentCount': len(assignments),
-            'eventCount': len(calendar_events)
-        }), 200
+        today = central_today()
+        
+        # The review only changes with the day, the calendar or the syllabi,
+        # so serve a recent or precomputed one instead of asking OpenAI again
+        stream = request.args.get('stream') == '1'
+        cache_key = weekly_advisor_cache_key(user, today)
+        cached = get_cached_weekly_review(cache_key)
+        if not cached:
+            cached = get_saved_weekly_review(user.id, today, cache_key)
+            if cached:
+                cache_weekly_review(cache_key, cached)
+        if cached:
+            if stream:
+                return event_stream_response(replay_weekly_review(cached))
+            return Response(cached, mimetype='application/json'), 200
+        
+        # ?stream=1 sends the summary right away, then the review as it is generated
+        if stream:
+            summary, messages = build_weekly_advisor(user, today)
+            return event_stream_response(stream_with_context(
+                stream_weekly_review(user.id, today, cache_key, summary, messages)
+            ))
+        
+        return jsonify(generate_weekly_review(user, today, cache_key)), 200
         
     except Exception as e:
         logger.error(f'Error in weekly advisor: {e}')
@@ -1128,14 +1709,8 @@ Format clearly with headers, bullet points, and emojis for visual appeal. Keep t
 def get_google_calendar_auth_url():
     """Get Google OAuth authorization URL"""
     try:
-        from google_auth_oauthlib.flow import Flow
-        import os
-        
         # Create OAuth flow
-        flow = Flow.from_client_secrets_file(
-            os.path.join(os.path.dirname(__file__), 'google_calendar_credentials.json'),
-            scopes=['https://www.googleapis.com/auth/calendar']
-        )
+        flow = Flow.from_client_config(load_google_client_config(), scopes=GOOGLE_OAUTH_SCOPES)
         
         # Redirect URI
         flow.redirect_uri = 'http://localhost:3000/calendar-auth-callback'
@@ -1164,9 +1739,7 @@ def get_google_calendar_auth_url():
 def get_user_status():
     """Get user status and integrations"""
     try:
-        from models import User
-        
-        user = User.query.get(request.user_id)
+        user = current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -1188,11 +1761,6 @@ def get_user_status():
 def google_calendar_callback():
     """Handle Google OAuth callback and store tokens"""
     try:
-        from google_auth_oauthlib.flow import Flow
-        from google.auth.transport.requests import Request
-        import os
-        from models import User, db
-        
         data = request.get_json()
         code = data.get('code')
         
@@ -1200,10 +1768,7 @@ def google_calendar_callback():
             return jsonify({'error': 'Authorization code required'}), 400
         
         # Create OAuth flow
-        flow = Flow.from_client_secrets_file(
-            os.path.join(os.path.dirname(__file__), 'google_calendar_credentials.json'),
-            scopes=['https://www.googleapis.com/auth/calendar']
-        )
+        flow = Flow.from_client_config(load_google_client_config(), scopes=GOOGLE_OAUTH_SCOPES)
         flow.redirect_uri = 'http://localhost:3000/calendar-auth-callback'
         
         # Exchange code for tokens
@@ -1211,16 +1776,14 @@ def google_calendar_callback():
         credentials = flow.credentials
         
         # Store tokens in database
-        user = User.query.get(request.user_id)
-        if not user:
+        if not update_user(
+            request.user_id,
+            google_calendar_token=credentials.token,
+            google_calendar_refresh_token=credentials.refresh_token,
+            google_calendar_token_expiry=credentials.expiry
+        ):
             return jsonify({'error': 'User not found'}), 404
         
-        user.google_calendar_token = credentials.token
-        user.google_calendar_refresh_token = credentials.refresh_token
-        user.google_calendar_token_expiry = credentials.expiry
-        
-        db.session.commit()
-        
         logger.info(f"✅ Google Calendar connected for user {request.user_id}")
         
         return jsonify({
@@ -1237,19 +1800,15 @@ def google_calendar_callback():
 def disconnect_google_calendar():
     """Disconnect Google Calendar"""
     try:
-        from models import User, db
-        
-        user = User.query.get(request.user_id)
-        if not user:
+        if not update_user(
+            request.user_id,
+            google_calendar_token=None,
+            google_calendar_refresh_token=None,
+            google_calendar_token_expiry=None,
+            selected_calendar_id='primary'
+        ):
             return jsonify({'error': 'User not found'}), 404
         
-        user.google_calendar_token = None
-        user.google_calendar_refresh_token = None
-        user.google_calendar_token_expiry = None
-        user.selected_calendar_id = 'primary'
-        
-        db.session.commit()
-        
         logger.info(f"✅ Google Calendar disconnected for user {request.user_id}")
         
         return jsonify({'message': 'Google Calendar disconnected'}), 200
@@ -1263,14 +1822,11 @@ def disconnect_google_calendar():
 def list_calendars():
     """List all available calendars for the user"""
     try:
-        from models import User
-        from utils.google_calendar import GoogleCalendarManager
-        
-        user = User.query.get(request.user_id)
+        user = current_user()
         if not user or not user.google_calendar_token:
             return jsonify({'error': 'Google Calendar not connected'}), 400
         
-        calendars = GoogleCalendarManager.list_calendars(user.google_calendar_token)
+        calendars = GoogleCalendarManager.list_calendars(google_calendar_token(user))
         
         return jsonify({
             'calendars': calendars,
@@ -1286,20 +1842,14 @@ def list_calendars():
 def select_calendar():
     """Set the selected calendar for the user"""
     try:
-        from models import User, db
-        
-        user = User.query.get(request.user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
         data = request.get_json()
         calendar_id = data.get('calendar_id')
         
         if not calendar_id:
             return jsonify({'error': 'Calendar ID required'}), 400
         
-        user.selected_calendar_id = calendar_id
-        db.session.commit()
+        if not update_user(request.user_id, selected_calendar_id=calendar_id):
+            return jsonify({'error': 'User not found'}), 404
         
         logger.info(f"✅ Calendar selected for user {request.user_id}: {calendar_id}")
         
@@ -1317,11 +1867,7 @@ def select_calendar():
 def create_calendar_event():
     """Create an event on user's Google Calendar"""
     try:
-        from models import User
-        from utils.google_calendar import GoogleCalendarManager
-        from datetime import datetime, timedelta
-        
-        user = User.query.get(request.user_id)
+        user = current_user()
         if not user or not user.google_calendar_token:
             return jsonify({'error': 'Google Calendar not connected'}), 400
         
@@ -1342,7 +1888,7 @@ def create_calendar_event():
             return jsonify({'error': 'Invalid date format'}), 400
         
         event = GoogleCalendarManager.create_event(
-            access_token=user.google_calendar_token,
+            access_token=google_calendar_token(user),
             title=title,
             start_time=start_dt,
             end_time=end_dt,
@@ -1364,11 +1910,7 @@ def create_calendar_event():
 def add_rev_suggested_event():
     """Add a Rev-suggested study event to calendar"""
     try:
-        from models import User
-        from utils.google_calendar import GoogleCalendarManager
-        from datetime import datetime
-        
-        user = User.query.get(request.user_id)
+        user = current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -1387,7 +1929,7 @@ def add_rev_suggested_event():
             end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
             
             event = GoogleCalendarManager.create_event(
-                access_token=user.google_calendar_token,
+                access_token=google_calendar_token(user),
                 title=title,
                 start_time=start_dt,
                 end_time=end_dt,
@@ -1422,11 +1964,7 @@ def add_rev_suggested_event():
 def block_calendar_time():
     """Block out time on user's calendar for study/work"""
     try:
-        from models import User
-        from utils.google_calendar import GoogleCalendarManager
-        from datetime import datetime
-        
-        user = User.query.get(request.user_id)
+        user = current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -1446,7 +1984,7 @@ def block_calendar_time():
             end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
             
             event = GoogleCalendarManager.create_event(
-                access_token=user.google_calendar_token,
+                access_token=google_calendar_token(user),
                 title=full_title,
                 start_time=start_dt,
                 end_time=end_dt,
@@ -1474,9 +2012,6 @@ def block_calendar_time():
 def import_canvas_calendar():
     """Import assignments and events from Canvas calendar feed"""
     try:
-        from utils.canvas import CanvasCalendarManager
-        from models import User, Syllabus, db
-        
         data = request.get_json()
         canvas_url = data.get('canvas_url')
         
@@ -1489,7 +2024,7 @@ def import_canvas_calendar():
         
         # Fetch and parse calendar
         calendar = CanvasCalendarManager.fetch_canvas_calendar(canvas_url)
-        if not calendar:
+        if calendar is None:
             return jsonify({'error': 'Failed to fetch Canvas calendar'}), 500
         
         # Extract events
@@ -1518,10 +2053,6 @@ def import_canvas_calendar():
 def import_canvas_and_create():
     """Import Canvas calendar and create syllabus entries"""
     try:
-        from utils.canvas import CanvasCalendarManager
-        from utils.openai import store_syllabus
-        from models import User, db
-        
         data = request.get_json()
         canvas_url = data.get('canvas_url')
         course_name = data.get('course_name', 'Canvas Imported Course')
@@ -1531,7 +2062,7 @@ def import_canvas_and_create():
         
         # Fetch and parse calendar
         calendar = CanvasCalendarManager.fetch_canvas_calendar(canvas_url)
-        if not calendar:
+        if calendar is None:
             return jsonify({'error': 'Failed to fetch Canvas calendar'}), 500
         
         # Extract and format events
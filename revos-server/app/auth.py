@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+from collections import OrderedDict
 from functools import wraps
+from threading import Lock
 import jwt
 import os
-from datetime import datetime, timedelta
+import time
+from sqlalchemy import select
 from models import db, User
 
 # Create auth blueprint
@@ -12,54 +15,91 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = 'HS256'
 TOKEN_EXPIRATION_HOURS = 24
+TOKEN_CACHE_SIZE = 4096
+TOKEN_REQUIRED_CLAIMS = ['user_id', 'exp', 'iat']
+
+# Payloads of tokens that verified, keyed by token, so repeat requests skip the
+# HMAC check. Failures are never stored, so a bad token is rechecked each time.
+_token_cache = OrderedDict()
+_token_cache_lock = Lock()
 
 def generate_token(user_id: int) -> str:
     """Generate a JWT token for the user."""
+    now = int(time.time())
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=TOKEN_EXPIRATION_HOURS),
-        'iat': datetime.utcnow()
+        'exp': now + TOKEN_EXPIRATION_HOURS * 3600,
+        'iat': now
     }
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-    return token
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(token: str) -> dict:
-    """Verify and decode a JWT token."""
+def _decode_token(token: str) -> dict:
+    """Decode a JWT token, remembering only successful decodes."""
+    with _token_cache_lock:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            _token_cache.move_to_end(token)
+            return payload
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM],
+                             options={'require': TOKEN_REQUIRED_CLAIMS})
     except jwt.InvalidTokenError:
         return None
+    
+    with _token_cache_lock:
+        _token_cache[token] = payload
+        _token_cache.move_to_end(token)
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return payload
+
+def verify_token(token: str) -> dict:
+    """Verify and decode a JWT token."""
+    payload = _decode_token(token)
+    # Expiry is checked here rather than in the cached decode, since a cached
+    # payload can outlive its token
+    if payload and payload['exp'] <= time.time():
+        return None
+    return payload
 
 def require_auth(f):
     """Decorator to require authentication on routes."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = None
-        
-        # Check for token in Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'error': 'Invalid authorization header'}), 401
-        
-        if not token:
-            return jsonify({'error': 'Missing authorization token'}), 401
-        
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'error': 'Invalid or expired token'}), 401
+        # A request that was already authenticated reuses the verified payload
+        if 'auth_payload' not in g:
+            token = None
+            
+            # Check for token in Authorization header
+            if 'Authorization' in request.headers:
+                auth_header = request.headers['Authorization']
+                try:
+                    token = auth_header.split(' ')[1]  # Bearer <token>
+                except IndexError:
+                    return jsonify({'error': 'Invalid authorization header'}), 401
+            
+            if not token:
+                return jsonify({'error': 'Missing authorization token'}), 401
+            
+            payload = verify_token(token)
+            if not payload:
+                return jsonify({'error': 'Invalid or expired token'}), 401
+            
+            g.auth_payload = payload
         
         # Add user_id to request context
-        request.user_id = payload['user_id']
+        request.user_id = g.auth_payload['user_id']
         return f(*args, **kwargs)
     
     return decorated_function
 
+def current_user():
+    """Return the authenticated user, loading the row at most once per request."""
+    if 'auth_user' not in g:
+        g.auth_user = db.session.get(User, g.auth_payload['user_id'])
+    return g.auth_user
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user."""
@@ -82,11 +122,17 @@ def register():
     if not password or len(password) < 6:
         return jsonify({'error': 'Password must be at least 6 characters'}), 400
     
-    # Check if user already exists
-    if User.query.filter_by(username=username).first():
+    # Check if user already exists (one query for both unique columns)
+    existing = db.session.execute(
+        select(User.username, User.email)
+        .where((User.username == username) | (User.email == email))
+        .order_by((User.username == username).desc())
+        .limit(1)
+    ).first()
+    if existing and existing.username == username:
         return jsonify({'error': 'Username already exists'}), 409
     
-    if User.query.filter_by(email=email).first():
+    if existing:
         return jsonify({'error': 'Email already exists'}), 409
     
     # Create new user
@@ -130,6 +176,10 @@ def login():
     if not user or not user.check_password(password):
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    # Save the hash if check_password upgraded it
+    if db.session.is_modified(user):
+        db.session.commit()
+    
     token = generate_token(user.id)
     
     return jsonify({
@@ -152,13 +202,16 @@ def verify():
     if not payload:
         return jsonify({'error': 'Invalid or expired token'}), 401
     
-    user = User.query.get(payload['user_id'])
+    # Only the columns to_dict needs; the password hash and refresh token stay in the database
+    user = db.session.execute(
+        select(*User.dict_columns()).where(User.id == payload['user_id'])
+    ).first()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
     return jsonify({
         'valid': True,
-        'user': user.to_dict(),
+        'user': User.row_to_dict(user),
         'token': token
     }), 200
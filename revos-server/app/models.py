@@ -1,10 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-import json
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from gevent import get_hub
+from gevent.monkey import is_module_patched
+from collections import OrderedDict
+from threading import Lock
+import orjson
 
 db = SQLAlchemy()
 
+# JSON everywhere, stored as binary JSONB if the database is ever Postgres
+JSONColumn = db.JSON().with_variant(JSONB(), 'postgresql')
+
+# Argon2id for password hashes. Older werkzeug (pbkdf2/scrypt) hashes are
+# still accepted and replaced with Argon2id on the user's next login.
+password_hasher = PasswordHasher(time_cost=3, memory_cost=65536, parallelism=4)
+
+def run_password_hash(fn, *args):
+    """Run a password hash or check without blocking the worker.
+
+    Under gevent the call goes to the hub's native thread pool, so other
+    greenlets keep serving while it hashes. Thread-based servers call it
+    directly, since argon2 releases the GIL while hashing.
+    """
+    if is_module_patched('threading'):
+        return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+# Serialized Syllabus rows keyed by id -> (updated_at, json bytes). A row is
+# re-serialized only after it changes, since every write bumps updated_at.
+SYLLABUS_JSON_CACHE_SIZE = 4096
+_syllabus_json_cache = OrderedDict()
+_syllabus_json_lock = Lock()
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -20,60 +51,174 @@ class User(db.Model):
     google_calendar_token_expiry = db.Column(db.DateTime, nullable=True)
     selected_calendar_id = db.Column(db.String(255), nullable=True, default='primary')
     
-    # Relationship to syllabi
-    syllabi = db.relationship('Syllabus', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Plaid integration (access token is encrypted with PLAID_TOKEN_KEY when set)
+    plaid_access_token = db.Column(db.Text, nullable=True)
+    plaid_item_id = db.Column(db.String(255), nullable=True)
+    # Where the last /transactions/sync left off; plaid_transactions holds everything before it
+    plaid_sync_cursor = db.Column(db.Text, nullable=True)
+    
+    # Relationship to syllabi. Left lazy so auth and calendar routes don't pay
+    # for syllabi they never read; routes that do read them use selectinload
+    syllabi = db.relationship('Syllabus', back_populates='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Hash and set the password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = run_password_hash(password_hasher.hash, password)
     
     def check_password(self, password):
-        """Check if the provided password matches the hash."""
-        return check_password_hash(self.password_hash, password)
+        """Check if the provided password matches the hash, rehashing it if outdated (caller commits)."""
+        if not self.password_hash.startswith('$argon2'):
+            if not run_password_hash(check_password_hash, self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        try:
+            run_password_hash(password_hasher.verify, self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def to_dict(self):
+        return User.row_to_dict(self)
+    
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        """Build the API dict from a User or a plain row of User.dict_columns()."""
         return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'created_at': self.created_at.isoformat(),
-            'google_calendar_connected': bool(self.google_calendar_token)
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'created_at': row.created_at,
+            'google_calendar_connected': bool(row.google_calendar_token)
         }
+    
+    @staticmethod
+    def dict_columns():
+        """The columns row_to_dict reads, so callers can skip password and refresh tokens."""
+        return (User.id, User.username, User.email, User.created_at, User.google_calendar_token)
 
 
 class Syllabus(db.Model):
     __tablename__ = 'syllabi'
+    # Every read filters by owner, and single-syllabus routes by (owner, id);
+    # the composite index serves both as well as a user_id-only index would.
+    # Deletes check whether any other syllabus still uses the course_id.
+    __table_args__ = (
+        db.Index('ix_syllabi_user_id_id', 'user_id', 'id'),
+        db.Index('ix_syllabi_course_id', 'course_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     course_id = db.Column(db.String(255), nullable=False)
     course_name = db.Column(db.String(255), nullable=False)
     instructor = db.Column(db.String(255))
     semester = db.Column(db.String(100))
     
     # Store parsed data as JSON
-    key_dates = db.Column(db.JSON, nullable=True, default=list)
-    topics = db.Column(db.JSON, nullable=True, default=list)
-    grading_breakdown = db.Column(db.JSON, nullable=True, default=list)
+    key_dates = db.Column(JSONColumn, nullable=True, default=list)
+    topics = db.Column(JSONColumn, nullable=True, default=list)
+    grading_breakdown = db.Column(JSONColumn, nullable=True, default=list)
     
     # Store vector IDs for Pinecone reference
-    vector_ids = db.Column(db.JSON, nullable=True, default=list)
+    vector_ids = db.Column(JSONColumn, nullable=True, default=list)
     
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    user = db.relationship('User', back_populates='syllabi')
+    
     def to_dict(self):
+        return Syllabus.row_to_dict(self)
+    
+    def to_json(self) -> bytes:
+        return Syllabus.row_to_json(self)
+    
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        """Build the API dict from a Syllabus or a plain column row with the same names.
+
+        Timestamps stay datetimes; orjson writes them in isoformat() form.
+        """
+        return {
+            'id': row.id,
+            'user_id': row.user_id,
+            'course_id': row.course_id,
+            'course_name': row.course_name,
+            'instructor': row.instructor,
+            'semester': row.semester,
+            'keyDates': row.key_dates,
+            'topics': row.topics,
+            'gradingBreakdown': row.grading_breakdown,
+            'vector_ids': row.vector_ids,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+    
+    @staticmethod
+    def row_to_json(row) -> bytes:
+        """Return row_to_dict() encoded as JSON, reusing the last encoding while the row is unchanged."""
+        with _syllabus_json_lock:
+            cached = _syllabus_json_cache.get(row.id)
+            if cached and cached[0] == row.updated_at:
+                _syllabus_json_cache.move_to_end(row.id)
+                return cached[1]
+        
+        body = orjson.dumps(Syllabus.row_to_dict(row))
+        with _syllabus_json_lock:
+            _syllabus_json_cache[row.id] = (row.updated_at, body)
+            _syllabus_json_cache.move_to_end(row.id)
+            if len(_syllabus_json_cache) > SYLLABUS_JSON_CACHE_SIZE:
+                _syllabus_json_cache.popitem(last=False)
+        return body
+
+
+class WeeklyReview(db.Model):
+    __tablename__ = 'weekly_reviews'
+    # One saved review per user and week; cache_key records the day and the
+    # syllabus/calendar state it was generated for
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'week_start', name='uq_weekly_reviews_user_week'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    cache_key = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.LargeBinary, nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PlaidTransaction(db.Model):
+    __tablename__ = 'plaid_transactions'
+    # A user's transactions as of their plaid_sync_cursor; insights read
+    # date ranges per user
+    __table_args__ = (
+        db.Index('ix_plaid_transactions_user_id_date', 'user_id', 'date'),
+    )
+    
+    transaction_id = db.Column(db.String(255), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    account_id = db.Column(db.String(255), nullable=True)
+    name = db.Column(db.Text, nullable=True)
+    merchant_name = db.Column(db.Text, nullable=True)
+    amount = db.Column(db.Float, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    category = db.Column(JSONColumn, nullable=True)
+    pending = db.Column(db.Boolean, nullable=False, default=False)
+    
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        """Build the same dict PlaidManager returns for a transaction."""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'course_id': self.course_id,
-            'course_name': self.course_name,
-            'instructor': self.instructor,
-            'semester': self.semester,
-            'keyDates': self.key_dates,
-            'topics': self.topics,
-            'gradingBreakdown': self.grading_breakdown,
-            'vector_ids': self.vector_ids,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'transaction_id': row.transaction_id,
+            'name': row.name,
+            'amount': row.amount,
+            'date': row.date.isoformat(),
+            'category': row.category,
+            'merchant_name': row.merchant_name,
+            'account_id': row.account_id,
+            'pending': row.pending,
         }
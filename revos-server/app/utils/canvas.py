@@ -4,20 +4,86 @@ Handles parsing Canvas calendar feeds (iCalendar format) to extract assignments,
 """
 
 import logging
+import os
+import re
 import requests
-from typing import Dict, List, Optional, Any
-from datetime import datetime
-import icalendar
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import pytz
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from dataclasses import dataclass
+from operator import attrgetter
+from datetime import date, datetime
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# One pooled session for every Canvas request, so imports reuse TCP/TLS connections;
+# rate limits and transient server errors are retried with backoff
+CANVAS_RETRY = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=CANVAS_RETRY))
+session.mount('http://', HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=CANVAS_RETRY))
+
+# (connect, read) timeouts: fail fast on an unreachable host, allow slow feeds
+CANVAS_TIMEOUT = (3.05, 10)
+
+# Skip the reachability probe in validate_canvas_url; fetching the feed reports unreachable URLs anyway
+CANVAS_FAST_VALIDATE = os.getenv('CANVAS_FAST_VALIDATE', '').lower() in ('1', 'true')
+
+# Feed bytes read per socket read while scanning (iter_lines defaults to 512)
+CANVAS_READ_CHUNK_SIZE = 64 * 1024
+
+# The only VEVENT properties we read; everything else in the feed is skipped
+VEVENT_PROPERTIES = frozenset(('SUMMARY', 'DESCRIPTION', 'DTSTART', 'DTEND', 'LOCATION', 'URL'))
+ICAL_TEXT_ESCAPE_RE = re.compile(r'\\([\\;,nN])')
+
+# Event types by summary keywords, tried in order. One compiled pattern covers
+# every type: each alternative looks ahead through the whole summary, so an
+# earlier type still wins wherever its keyword appears, and lastgroup names it.
+EVENT_TYPE_KEYWORDS = (
+    ('homework', ('[hw]', 'homework', 'assignment')),
+    ('exam', ('exam', 'midterm', 'final')),
+    ('quiz', ('quiz', 'quizzes')),
+    ('lab', ('lab', 'laboratory')),
+    ('project', ('project', 'presentation')),
+)
+EVENT_TYPE_RE = re.compile(
+    '|'.join(
+        f"(?=.*?(?P<{event_type}>{'|'.join(map(re.escape, keywords))}))"
+        for event_type, keywords in EVENT_TYPE_KEYWORDS
+    ),
+    re.IGNORECASE | re.DOTALL
+)
+
+# Event types that become syllabus key dates, and what each uses as its note
+KEY_DATE_NOTES = {
+    'homework': attrgetter('description'),
+    'exam': attrgetter('location'),
+    'quiz': lambda event: '',
+}
+
+# COURSE_LETTERS COURSE_DIGITS or COURSE_LETTERS-COURSE_DIGITS (e.g. CSCE-120, CHEM 107)
+COURSE_CODE_RE = re.compile(r'([A-Z]+\s*-?\s*\d+)')
+
+@dataclass(slots=True)
+class CanvasEvent:
+    """One Canvas calendar event; slotted since large feeds hold thousands of them"""
+    summary: str
+    description: str
+    location: str
+    url: str
+    type: str
+    course: Optional[str]
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
 class CanvasCalendarManager:
     """Manages Canvas calendar feed integration"""
     
     @staticmethod
-    def fetch_canvas_calendar(calendar_url: str) -> Optional[icalendar.Calendar]:
-        """Fetch and parse Canvas calendar feed"""
+    def fetch_canvas_calendar(calendar_url: str) -> Optional[List[Dict[str, Tuple[str, str]]]]:
+        """Fetch a Canvas calendar feed and scan out the properties of each VEVENT"""
         try:
             if not calendar_url:
                 logger.error("Canvas calendar URL is empty")
@@ -25,12 +91,13 @@ class CanvasCalendarManager:
             
             logger.info(f"Fetching Canvas calendar from: {calendar_url}")
             
-            response = requests.get(calendar_url, timeout=10)
-            response.raise_for_status()
+            # Scan the feed as it downloads instead of building a full calendar tree
+            with session.get(calendar_url, timeout=CANVAS_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                vevents = CanvasCalendarManager._scan_vevents(response.iter_lines(chunk_size=CANVAS_READ_CHUNK_SIZE))
             
-            calendar = icalendar.Calendar.from_ical(response.content)
             logger.info("✅ Successfully parsed Canvas calendar feed")
-            return calendar
+            return vevents
             
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ Error fetching Canvas calendar: {e}")
@@ -40,16 +107,73 @@ class CanvasCalendarManager:
             return None
     
     @staticmethod
-    def extract_events(calendar: icalendar.Calendar) -> List[Dict[str, Any]]:
-        """Extract all events from Canvas calendar feed"""
+    def _unfold_lines(lines: Iterable[bytes]) -> Iterable[str]:
+        """Yield logical iCalendar lines, joining folded continuation lines"""
+        pending = None
+        for raw in lines:
+            if not raw:
+                continue
+            if raw[:1] in (b' ', b'\t'):
+                if pending is not None:
+                    pending += raw[1:]
+                continue
+            if pending is not None:
+                yield pending.decode('utf-8', 'replace')
+            pending = raw
+        if pending is not None:
+            yield pending.decode('utf-8', 'replace')
+    
+    @staticmethod
+    def _split_property(line: str) -> Tuple[str, str, str]:
+        """Split 'NAME;PARAM=x:value' into ('NAME', 'PARAM=x', 'value')"""
+        colon = line.find(':')
+        if '"' in line[:colon]:
+            # A quoted parameter may itself contain ':'
+            in_quotes = False
+            for i, ch in enumerate(line):
+                if ch == '"':
+                    in_quotes = not in_quotes
+                elif ch == ':' and not in_quotes:
+                    colon = i
+                    break
+        if colon == -1:
+            return line.upper(), '', ''
+        name, _, params = line[:colon].partition(';')
+        return name.upper(), params, line[colon + 1:]
+    
+    @staticmethod
+    def _scan_vevents(lines: Iterable[bytes]) -> List[Dict[str, Tuple[str, str]]]:
+        """Collect the kept properties of each VEVENT as name -> (params, value)"""
+        vevents = []
+        vevent = None
+        nested = 0
+        for line in CanvasCalendarManager._unfold_lines(lines):
+            name, params, value = CanvasCalendarManager._split_property(line)
+            if name == 'BEGIN':
+                if vevent is not None:
+                    nested += 1  # e.g. a VALARM inside the event
+                elif value.upper() == 'VEVENT':
+                    vevent = {}
+            elif name == 'END':
+                if nested:
+                    nested -= 1
+                elif vevent is not None and value.upper() == 'VEVENT':
+                    vevents.append(vevent)
+                    vevent = None
+            elif vevent is not None and not nested and name in VEVENT_PROPERTIES and name not in vevent:
+                vevent[name] = (params, value)
+        return vevents
+    
+    @staticmethod
+    def extract_events(vevents: List[Dict[str, Tuple[str, str]]]) -> List[CanvasEvent]:
+        """Extract all events from the scanned Canvas calendar feed"""
         try:
             events = []
             
-            for component in calendar.walk():
-                if component.name == "VEVENT":
-                    event_data = CanvasCalendarManager._parse_vevent(component)
-                    if event_data:
-                        events.append(event_data)
+            for vevent in vevents:
+                event_data = CanvasCalendarManager._parse_vevent(vevent)
+                if event_data:
+                    events.append(event_data)
             
             logger.info(f"✅ Extracted {len(events)} events from Canvas calendar")
             return events
@@ -59,40 +183,48 @@ class CanvasCalendarManager:
             return []
     
     @staticmethod
-    def _parse_vevent(component) -> Optional[Dict[str, Any]]:
-        """Parse individual VEVENT component"""
+    def _unescape_text(value: str) -> str:
+        """Undo iCalendar TEXT escaping (\\n, \\, \\; and \\\\)"""
+        return ICAL_TEXT_ESCAPE_RE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+    
+    @staticmethod
+    def _format_date(params: str, value: str) -> str:
+        """ISO-format a DTSTART/DTEND value: a date, a UTC time, or a time in its TZID"""
+        value = value.strip()
+        if len(value) == 8:
+            return date(int(value[:4]), int(value[4:6]), int(value[6:8])).isoformat()
+        
+        dt = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+        if value.endswith('Z'):
+            return dt.replace(tzinfo=pytz.utc).isoformat()
+        for param in params.split(';'):
+            key, _, tzid = param.partition('=')
+            if key.upper() == 'TZID':
+                try:
+                    return pytz.timezone(tzid.strip('"')).localize(dt).isoformat()
+                except pytz.UnknownTimeZoneError:
+                    break
+        return dt.isoformat()
+    
+    @staticmethod
+    def _parse_vevent(vevent: Dict[str, Tuple[str, str]]) -> Optional[CanvasEvent]:
+        """Parse the scanned properties of one VEVENT"""
         try:
-            event = {}
-            
             # Extract basic fields
-            event['summary'] = str(component.get('summary', 'Untitled'))
-            event['description'] = str(component.get('description', ''))
-            
-            # Parse dates
-            dtstart = component.get('dtstart')
-            dtend = component.get('dtend')
-            
-            if dtstart:
-                dt = dtstart.dt
-                event['start_date'] = dt.isoformat() if hasattr(dt, 'isoformat') else str(dt)
-            
-            if dtend:
-                dt = dtend.dt
-                event['end_date'] = dt.isoformat() if hasattr(dt, 'isoformat') else str(dt)
-            
-            # Extract location
-            event['location'] = str(component.get('location', ''))
-            
-            # Extract URL
-            event['url'] = str(component.get('url', ''))
+            summary = CanvasCalendarManager._unescape_text(vevent['SUMMARY'][1]) if 'SUMMARY' in vevent else 'Untitled'
             
-            # Determine event type
-            event['type'] = CanvasCalendarManager._determine_event_type(event['summary'])
-            
-            # Extract course code if present
-            event['course'] = CanvasCalendarManager._extract_course_code(event['summary'])
-            
-            return event
+            return CanvasEvent(
+                summary=summary,
+                description=CanvasCalendarManager._unescape_text(vevent['DESCRIPTION'][1]) if 'DESCRIPTION' in vevent else '',
+                location=CanvasCalendarManager._unescape_text(vevent['LOCATION'][1]) if 'LOCATION' in vevent else '',
+                url=vevent['URL'][1] if 'URL' in vevent else '',
+                # Determine event type and course code from the summary
+                type=CanvasCalendarManager._determine_event_type(summary),
+                course=CanvasCalendarManager._extract_course_code(summary),
+                # Parse dates
+                start_date=CanvasCalendarManager._format_date(*vevent['DTSTART']) if 'DTSTART' in vevent else None,
+                end_date=CanvasCalendarManager._format_date(*vevent['DTEND']) if 'DTEND' in vevent else None
+            )
             
         except Exception as e:
             logger.error(f"❌ Error parsing VEVENT: {e}")
@@ -101,29 +233,13 @@ class CanvasCalendarManager:
     @staticmethod
     def _determine_event_type(summary: str) -> str:
         """Determine event type based on summary text"""
-        summary_lower = summary.lower()
-        
-        if any(x in summary_lower for x in ['[hw]', 'homework', 'assignment']):
-            return 'homework'
-        elif any(x in summary_lower for x in ['exam', 'midterm', 'final']):
-            return 'exam'
-        elif any(x in summary_lower for x in ['quiz', 'quizzes']):
-            return 'quiz'
-        elif any(x in summary_lower for x in ['lab', 'laboratory']):
-            return 'lab'
-        elif any(x in summary_lower for x in ['project', 'presentation']):
-            return 'project'
-        else:
-            return 'event'
+        match = EVENT_TYPE_RE.match(summary)
+        return match.lastgroup if match else 'event'
     
     @staticmethod
     def _extract_course_code(summary: str) -> Optional[str]:
         """Extract course code from summary (e.g., CSCE-120, CHEM 107)"""
-        import re
-        
-        # Pattern: COURSE_LETTERS COURSE_DIGITS or COURSE_LETTERS-COURSE_DIGITS
-        pattern = r'([A-Z]+\s*-?\s*\d+)'
-        match = re.search(pattern, summary)
+        match = COURSE_CODE_RE.search(summary)
         
         if match:
             course = match.group(1).replace(' ', '').replace('-', ' ')
@@ -132,40 +248,24 @@ class CanvasCalendarManager:
         return None
     
     @staticmethod
-    def format_for_syllabus(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def format_for_syllabus(events: List[CanvasEvent]) -> Dict[str, Any]:
         """Format Canvas events into syllabus-compatible structure"""
         try:
             formatted = {
-                'keyDates': [],
+                'keyDates': [
+                    {
+                        'date': event.start_date or '',
+                        'event': event.summary,
+                        'type': event.type,
+                        'note': note(event)
+                    }
+                    for event in events
+                    if (note := KEY_DATE_NOTES.get(event.type))
+                ],
                 'topics': [],
-                'events': []
+                'events': events
             }
             
-            for event in events:
-                if event['type'] == 'homework':
-                    formatted['keyDates'].append({
-                        'date': event.get('start_date', ''),
-                        'event': event['summary'],
-                        'type': 'homework',
-                        'note': event.get('description', '')
-                    })
-                elif event['type'] == 'exam':
-                    formatted['keyDates'].append({
-                        'date': event.get('start_date', ''),
-                        'event': event['summary'],
-                        'type': 'exam',
-                        'note': event.get('location', '')
-                    })
-                elif event['type'] == 'quiz':
-                    formatted['keyDates'].append({
-                        'date': event.get('start_date', ''),
-                        'event': event['summary'],
-                        'type': 'quiz',
-                        'note': ''
-                    })
-                
-                formatted['events'].append(event)
-            
             logger.info(f"✅ Formatted {len(formatted['keyDates'])} key dates from Canvas events")
             return formatted
             
@@ -189,8 +289,11 @@ class CanvasCalendarManager:
                 logger.warning(f"⚠️ URL doesn't appear to be a Canvas calendar feed: {url}")
                 return False
             
+            if CANVAS_FAST_VALIDATE:
+                return True
+            
             # Try to fetch it
-            response = requests.head(url, timeout=5, allow_redirects=True)
+            response = session.head(url, timeout=5, allow_redirects=True)
             if response.status_code == 200:
                 logger.info(f"✅ Canvas calendar URL is valid")
                 return True
@@ -4,31 +4,69 @@ Handles calendar event retrieval and management
 """
 
 import os
+import hashlib
 import logging
+import time
+from collections import OrderedDict
+from threading import Lock
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import pickle
+import httplib2
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
 
 logger = logging.getLogger(__name__)
 
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+# Texas A&M's timezone, used for every week/day boundary. app.py imports this
+# one, so every module uses the same zoneinfo object.
+CENTRAL_TZ = ZoneInfo('America/Chicago')
+
+# Ask only for the event fields we format, in as few pages as the API allows
+EVENT_LIST_FIELDS = 'nextPageToken,items(id,summary,description,location,transparency,start(dateTime,date),end(dateTime,date))'
+EVENT_LIST_PAGE_SIZE = 2500
+
+# Socket timeout for Calendar API calls (httplib2 waits indefinitely by default).
+# Only the setting is shared; every service gets its own httplib2.Http.
+CALENDAR_HTTP_TIMEOUT = 10
+# The bundled Calendar v3 discovery document, read from disk once. Services are
+# built from it per call: a built service and its transport must not be shared
+# by concurrent requests, even for the same user.
+_discovery_doc = None
+
+# Formatted results keyed by (token hash, what was asked) -> (fetched_at, result), so
+# dashboards polling the same week or calendar list don't spend API quota each time
+RESPONSE_CACHE_TTL = 5 * 60
+RESPONSE_CACHE_SIZE = 10_000
+_response_cache = OrderedDict()
+_response_cache_lock = Lock()
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
 
 class GoogleCalendarManager:
     """Manages Google Calendar interactions"""
 
     @staticmethod
     def get_calendar_service(access_token: str = None):
-        """Get authenticated Google Calendar service"""
+        """Build an authenticated Google Calendar service for one request"""
+        global _discovery_doc
         try:
             if access_token:
+                if _discovery_doc is None:
+                    _discovery_doc = get_static_doc('calendar', 'v3')
+                
                 credentials = Credentials(token=access_token)
-                return build('calendar', 'v3', credentials=credentials)
+                http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=CALENDAR_HTTP_TIMEOUT))
+                return build_from_document(_discovery_doc, http=http)
             else:
                 # For demo purposes, return None if no token available
                 logger.warning("No Google Calendar credentials available")
@@ -38,92 +76,68 @@ class GoogleCalendarManager:
             return None
 
     @staticmethod
-    def get_week_events(access_token: str = None, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
-        """Get calendar events for a specific week"""
-        try:
-            import pytz
-            service = GoogleCalendarManager.get_calendar_service(access_token)
-            if not service:
-                logger.warning("Calendar service not available")
-                return []
+    def _cached_response(key: tuple):
+        """Return a fresh cached result for key, or None"""
+        with _response_cache_lock:
+            cached = _response_cache.get(key)
+            if cached and time.monotonic() - cached[0] < RESPONSE_CACHE_TTL:
+                _response_cache.move_to_end(key)
+                return cached[1]
+        return None
 
-            # Default to current week in Central Time
-            if not start_date:
-                central = pytz.timezone('America/Chicago')
-                today = datetime.now(central)
-                start_date = today - timedelta(days=today.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            if not end_date:
-                end_date = start_date + timedelta(days=7)
-
-            # Ensure timezone-aware datetimes for Google Calendar API
-            if start_date.tzinfo is None:
-                central = pytz.timezone('America/Chicago')
-                start_date = central.localize(start_date)
-            
-            if end_date.tzinfo is None:
-                central = pytz.timezone('America/Chicago')
-                end_date = central.localize(end_date)
-
-            # Format dates as RFC 3339 strings (Google Calendar API requirement)
-            start_str = start_date.isoformat()
-            end_str = end_date.isoformat()
+    @staticmethod
+    def _cache_response(key: tuple, result) -> None:
+        with _response_cache_lock:
+            _response_cache[key] = (time.monotonic(), result)
+            _response_cache.move_to_end(key)
+            if len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
 
-            logger.info(f"🗓️ Fetching calendar events from {start_str} to {end_str}")
+    @staticmethod
+    def _forget_responses(access_token: str) -> None:
+        """Drop every cached result for a token, e.g. after it created an event"""
+        token_key = _token_key(access_token)
+        with _response_cache_lock:
+            for key in [key for key in _response_cache if key[0] == token_key]:
+                del _response_cache[key]
 
-            # Query calendar events
+    @staticmethod
+    def _list_events(service, calendar_id: str, time_min: str, time_max: str) -> List[Dict[str, Any]]:
+        """List the events in a time range, following pages and fetching only the formatted fields"""
+        events = []
+        page_token = None
+        while True:
             events_result = service.events().list(
-                calendarId='primary',
-                timeMin=start_str,
-                timeMax=end_str,
+                calendarId=calendar_id,
+                timeMin=time_min,
+                timeMax=time_max,
                 singleEvents=True,
-                orderBy='startTime'
+                orderBy='startTime',
+                maxResults=EVENT_LIST_PAGE_SIZE,
+                fields=EVENT_LIST_FIELDS,
+                pageToken=page_token
             ).execute()
+            events.extend(events_result.get('items', []))
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return events
 
-            events = events_result.get('items', [])
-            
-            # Format events
-            formatted_events = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-                
-                formatted_events.append({
-                    'id': event.get('id'),
-                    'title': event.get('summary', 'Untitled'),
-                    'description': event.get('description', ''),
-                    'start': start,
-                    'end': end,
-                    'location': event.get('location', ''),
-                    'busy': event.get('transparency', 'opaque') == 'opaque',
-                })
-
-            logger.info(f"✅ Retrieved {len(formatted_events)} calendar events")
-            return formatted_events
-
-        except HttpError as error:
-            logger.error(f"❌ Google Calendar API error: {error}")
-            logger.debug(f"Error details: {error.content if hasattr(error, 'content') else 'No details'}")
-            return []
-        except Exception as e:
-            logger.error(f"❌ Error getting week events: {e}")
-            return []
+    @staticmethod
+    def get_week_events(access_token: str = None, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
+        """Get calendar events for a specific week from the primary calendar"""
+        return GoogleCalendarManager.get_week_events_from_calendar(access_token, 'primary', start_date, end_date)
 
     @staticmethod
     def get_week_events_from_calendar(access_token: str = None, calendar_id: str = 'primary', start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
         """Get calendar events from a specific calendar"""
         try:
-            import pytz
-            service = GoogleCalendarManager.get_calendar_service(access_token)
-            if not service:
+            if not access_token:
                 logger.warning("Calendar service not available")
                 return []
 
             # Default to current week in Central Time
             if not start_date:
-                central = pytz.timezone('America/Chicago')
-                today = datetime.now(central)
+                today = datetime.now(CENTRAL_TZ)
                 start_date = today - timedelta(days=today.weekday())
                 start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
             
@@ -132,29 +146,30 @@ class GoogleCalendarManager:
 
             # Ensure timezone-aware datetimes for Google Calendar API
             if start_date.tzinfo is None:
-                central = pytz.timezone('America/Chicago')
-                start_date = central.localize(start_date)
+                start_date = start_date.replace(tzinfo=CENTRAL_TZ)
             
             if end_date.tzinfo is None:
-                central = pytz.timezone('America/Chicago')
-                end_date = central.localize(end_date)
+                end_date = end_date.replace(tzinfo=CENTRAL_TZ)
 
             # Format dates as RFC 3339 strings (Google Calendar API requirement)
             start_str = start_date.isoformat()
             end_str = end_date.isoformat()
 
+            cache_key = (_token_key(access_token), 'events', calendar_id, start_str, end_str)
+            cached = GoogleCalendarManager._cached_response(cache_key)
+            if cached is not None:
+                return cached
+
+            # Build the service only when the API is actually called
+            service = GoogleCalendarManager.get_calendar_service(access_token)
+            if not service:
+                logger.warning("Calendar service not available")
+                return []
+
             logger.info(f"🗓️ Fetching calendar events from {start_str} to {end_str} (calendar: {calendar_id})")
 
             # Query calendar events
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=start_str,
-                timeMax=end_str,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
+            events = GoogleCalendarManager._list_events(service, calendar_id, start_str, end_str)
             
             # Format events
             formatted_events = []
@@ -173,6 +188,7 @@ class GoogleCalendarManager:
                 })
 
             logger.info(f"✅ Retrieved {len(formatted_events)} events from calendar {calendar_id}")
+            GoogleCalendarManager._cache_response(cache_key, formatted_events)
             return formatted_events
 
         except HttpError as error:
@@ -187,6 +203,15 @@ class GoogleCalendarManager:
     def list_calendars(access_token: str = None) -> List[Dict[str, Any]]:
         """List all available calendars for the user"""
         try:
+            if not access_token:
+                logger.warning("Calendar service not available")
+                return []
+
+            cache_key = (_token_key(access_token), 'calendars')
+            cached = GoogleCalendarManager._cached_response(cache_key)
+            if cached is not None:
+                return cached
+
             service = GoogleCalendarManager.get_calendar_service(access_token)
             if not service:
                 logger.warning("Calendar service not available")
@@ -206,6 +231,7 @@ class GoogleCalendarManager:
                 })
 
             logger.info(f"✅ Retrieved {len(formatted_calendars)} calendars")
+            GoogleCalendarManager._cache_response(cache_key, formatted_calendars)
             return formatted_calendars
 
         except HttpError as error:
@@ -250,6 +276,8 @@ class GoogleCalendarManager:
                 body=event
             ).execute()
 
+            # The new event belongs in this user's cached weeks
+            GoogleCalendarManager._forget_responses(access_token)
             logger.info(f"✅ Created calendar event: {title}")
             return {
                 'id': created_event.get('id'),
@@ -0,0 +1,63 @@
+"""
+Background job queue for work too slow to run inside a request.
+
+Jobs are executed by a separate RQ worker process, started from the app
+directory so the same imports resolve:
+
+    cd revos-server/app && rq worker revos --url $REDIS_URL
+
+Weekly reviews are precomputed by running enqueue_weekly_reviews() just after
+midnight Central each day (e.g. from cron).
+"""
+
+import os
+import logging
+from redis import Redis
+from rq import Queue
+from sqlalchemy import select
+
+from models import db, User
+from utils.openai import process_uploaded_file
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+JOB_QUEUE_NAME = 'revos'
+JOB_TIMEOUT = 600
+JOB_RESULT_TTL = 3600
+
+redis_conn = Redis.from_url(REDIS_URL)
+job_queue = Queue(JOB_QUEUE_NAME, connection=redis_conn, default_timeout=JOB_TIMEOUT)
+
+def process_upload_job(tmp_path: str, filename: str, user_id: int):
+    """Process a syllabus file saved to disk by the upload endpoint."""
+    # Imported lazily: the worker needs the Flask app for its database context
+    from app import app
+
+    try:
+        with app.app_context(), open(tmp_path, 'rb') as f:
+            result = process_uploaded_file(f, filename, user_id)
+        if not result['success']:
+            logger.error(f"❌ Upload job failed for {filename}: {result['error']}")
+        return result
+    finally:
+        os.remove(tmp_path)
+
+def generate_weekly_review_job(user_id: int):
+    """Precompute today's weekly advisor review for one user."""
+    from app import app, precompute_weekly_review
+
+    with app.app_context():
+        precompute_weekly_review(user_id)
+
+def enqueue_weekly_reviews():
+    """Queue a weekly review precompute for every user."""
+    from app import app
+
+    with app.app_context():
+        user_ids = db.session.execute(select(User.id)).scalars().all()
+    job_queue.enqueue_many([
+        Queue.prepare_data(generate_weekly_review_job, args=(user_id,), result_ttl=0)
+        for user_id in user_ids
+    ])
+    logger.info(f"✅ Queued weekly reviews for {len(user_ids)} users")
@@ -1,17 +1,29 @@
 import openai
+import httpx
+import atexit
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 import os
-import json
+import orjson
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, BinaryIO, Iterable
+from itertools import chain
 import time
 import re
+import hashlib
+import struct
+from array import array
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta
 import PyPDF2
 import pdfplumber
 from docx import Document
+from models import db, Syllabus
+from sqlalchemy import insert
 import io
+import codecs
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,11 +37,20 @@ try:
 except Exception as e:
     logger.warning(f"Could not load .env file: {e}")
 
+# One pooled transport shared by every OpenAI call. The long keep-alive keeps
+# TLS connections warm between chat turns instead of re-handshaking after
+# httpx's 5 s default idle expiry.
+http_client = httpx.Client(
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=300),
+)
+atexit.register(http_client.close)
+
 openai_api_key = os.getenv("OPENAI_API_KEY")
 client = None
 if openai_api_key:
     try:
-        client = openai.OpenAI(api_key=openai_api_key, timeout=30.0)
+        client = openai.OpenAI(api_key=openai_api_key, timeout=30.0, http_client=http_client)
     except Exception as e:
         logger.error(f"Failed to initialize OpenAI client: {e}")
 
@@ -46,119 +67,483 @@ if pinecone_api_key:
 
 INDEX_NAME = "revos-syllabus"
 DIMENSION = 1536
+# Threads (and pooled HTTP connections) the index uses for async_req upserts
+PINECONE_POOL_THREADS = 8
+# Texts per embeddings request, and vectors per Pinecone upsert; keeps each request
+# well under the embeddings input limits and Pinecone's 100-vector upsert guidance
+EMBEDDING_BATCH_SIZE = 96
+UPLOAD_READ_CHUNK_SIZE = 64 * 1024
+# Characters Pinecone vector ids can't contain, and the JSON object in a chat reply
+VECTOR_ID_UNSAFE_RE = re.compile(r'[^a-zA-Z0-9_-]')
+JSON_OBJECT_RE = re.compile(r'\{[\s\S]*\}')
 
 SYSTEM_PROMPT = "You are Rev, Texas A&M mascot. Help with academic questions using provided syllabus info."
 
+# Embeddings are deterministic per (model, text), so re-uploads and repeated
+# questions reuse them from Redis, stored int8-quantized (about 1.5 KB each)
+EMBEDDING_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Parsed syllabi are cached by everything that shapes the completion, so a
+# re-uploaded file skips the LLM call. Bump the version whenever the prompt
+# changes. SYLLABUS_PARSE_CACHE is 'readwrite' (default), 'readonly' or 'disabled'.
+SYLLABUS_PARSE_PROMPT_VERSION = 2
+SYLLABUS_PARSE_MAX_TOKENS = 5000
+SYLLABUS_PARSE_TEXT_LIMIT = 10000
+SYLLABUS_PARSE_CACHE_TTL = 30 * 24 * 60 * 60
+SYLLABUS_PARSE_CACHE = os.getenv('SYLLABUS_PARSE_CACHE', 'readwrite').lower()
+
+SYLLABUS_PARSE_PROMPT = """You are an expert syllabus parser. Extract everything important from the syllabus below; do not skip or abbreviate.
+
+COURSE: full course number and title (e.g. "CSCE 120: Program Design and Concepts"), the primary instructor (or "Multiple Instructors"), and the semester with year (e.g. "Fall 2025").
+
+KEY DATES: every exam, midterm, final, quiz, homework due date, lab, project milestone and deadline (drop dates, last day of classes) as its own entry.
+- List each homework/assignment separately (HW 1, HW 2, ...).
+- Convert "Week of Sep 22" or "around Oct 27" to a calendar date, using the year if it appears elsewhere.
+- Describe recurring labs as "Weekly during lab session".
+
+GRADING: every weighted category with its percentage. Record section- or honors-specific weights in "note".
+
+TOPICS: every topic in any "Topics", "Content" or "Course Outline" section, plus key concepts from the learning outcomes. No duplicates.
+
+Only extract what the syllabus states; never invent dates, weights or topics.
+
+Respond with JSON only, in this shape:
+{{
+  "course": "string",
+  "instructor": "string",
+  "semester": "string",
+  "keyDates": [{{"date": "Month Day, Year or range", "event": "string", "type": "exam|quiz|homework|lab|project|other", "note": "optional"}}],
+  "topics": ["string"],
+  "gradingBreakdown": [{{"category": "string", "weight": number, "note": "optional"}}]
+}}
+
+SYLLABUS TEXT:
+{text}
+
+Return ONLY valid JSON. No markdown. No explanations. Start with {{ and end with }}."""
+
+# Runs the Pinecone legs of a question alongside each other and off the response path
+query_executor = ThreadPoolExecutor(max_workers=int(os.getenv('QUERY_THREADS', '16')), thread_name_prefix='query')
+
+# Answers to questions at least this similar to an earlier one are reused
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL = 24 * 60 * 60
+
+# Per-process budgets (so divide the account limits by the number of workers).
+# A limit of 0 turns that check off.
+OPENAI_RPM = int(os.getenv('OPENAI_RPM', '500'))
+OPENAI_TPM = int(os.getenv('OPENAI_TPM', '200000'))
+PINECONE_RPM = int(os.getenv('PINECONE_RPM', '6000'))
+# Completion budget assumed for chat calls that don't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, refilled continuously.
+
+    acquire() blocks until both buckets have room, so bursts are smoothed out
+    here instead of coming back as 429s and retry storms.
+    """
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_tokens = float(requests_per_minute)
+        self.token_tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = Lock()
+    
+    def acquire(self, tokens: int = 0):
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        else:
+            tokens = 0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self.updated
+                self.updated = now
+                if self.requests_per_minute:
+                    self.request_tokens = min(self.requests_per_minute, self.request_tokens + elapsed * self.requests_per_minute / 60)
+                if self.tokens_per_minute:
+                    self.token_tokens = min(self.tokens_per_minute, self.token_tokens + elapsed * self.tokens_per_minute / 60)
+                
+                request_wait = 0.0
+                if self.requests_per_minute and self.request_tokens < 1:
+                    request_wait = (1 - self.request_tokens) * 60 / self.requests_per_minute
+                token_wait = 0.0
+                if tokens and self.token_tokens < tokens:
+                    token_wait = (tokens - self.token_tokens) * 60 / self.tokens_per_minute
+                
+                if not request_wait and not token_wait:
+                    if self.requests_per_minute:
+                        self.request_tokens -= 1
+                    self.token_tokens -= tokens
+                    return
+            time.sleep(max(request_wait, token_wait))
+
+openai_limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
+pinecone_limiter = RateLimiter(PINECONE_RPM)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def wait_for_chat_budget(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None):
+    """Block until the OpenAI limiter admits a chat call with these messages."""
+    prompt_tokens = sum(estimate_tokens(str(m.get('content', ''))) for m in messages)
+    openai_limiter.acquire(prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS))
+
+def vector_id_prefix(course_id: str) -> str:
+    """Prefix of a course's Pinecone vector ids, which are "<prefix><n>".
+
+    Upserts and deletes must both use this. It is "<course>_" with unsafe
+    characters replaced, or "" if nothing of the course id survives.
+    """
+    sanitized = VECTOR_ID_UNSAFE_RE.sub('_', course_id.encode('ascii', 'ignore').decode('ascii'))
+    return f"{sanitized}_".lstrip('_')
+
 class PineconeManager:
     def __init__(self):
-        self.index = None
-        self._initialize_index()
+        self._index = None
+        self._initialized = False
+        self._init_lock = Lock()
+    
+    @property
+    def index(self):
+        # Connect on first use rather than at import, so each worker opens its
+        # own connection after forking instead of every boot hitting Pinecone
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._index = self._initialize_index()
+                    self._initialized = True
+        return self._index
     
     def _initialize_index(self):
         try:
             if not pc:
                 logger.warning("Pinecone not initialized")
-                return
+                return None
             if INDEX_NAME not in pc.list_indexes().names():
                 logger.info(f"Creating index: {INDEX_NAME}")
                 pc.create_index(name=INDEX_NAME, dimension=DIMENSION, metric="cosine",
                     spec=ServerlessSpec(cloud="aws", region="us-east-1"))
                 time.sleep(10)
-            self.index = pc.Index(INDEX_NAME)
+            index = pc.Index(INDEX_NAME, pool_threads=PINECONE_POOL_THREADS)
             logger.info(f"Connected to Pinecone index: {INDEX_NAME}")
+            return index
         except Exception as e:
             logger.error(f"Error initializing index: {e}")
+            return None
     
-    def upsert_syllabus_content(self, course_id: str, content_chunks: List[Dict[str, Any]]):
+    def upsert_syllabus_content(self, course_id: str, texts: List[str], course_name: str = '') -> List[str]:
+        """Embed and upsert a course's texts, returning the vector ids written ([] on failure)."""
         try:
             if not self.index:
-                return False
-            vectors = []
-            for i, chunk in enumerate(content_chunks):
-                embedding = generate_embedding(chunk['text'])
-                sanitized = course_id.encode('ascii', 'ignore').decode('ascii')
-                sanitized = re.sub(r'[^a-zA-Z0-9_-]', '_', sanitized)
-                vector_id = f"{sanitized}_{i}".strip('_')
-                if not vector_id:
-                    vector_id = f"v_{i}"
-                vectors.append({
-                    'id': vector_id,
-                    'values': embedding,
-                    'metadata': {
-                        'course_id': course_id,
-                        'course_name': chunk.get('course_name', ''),
-                        'text': chunk['text'][:500]
+                return []
+            # course_id is the same for every text, so build the id prefix once
+            id_prefix = vector_id_prefix(course_id)
+            # Embed one batch while the previous batch's upsert is still in flight
+            # on the index's connection pool, then wait for every upsert to land
+            # before reporting success
+            pending = []
+            for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+                vectors = [
+                    {
+                        'id': f"{id_prefix}{i}",
+                        'values': embedding,
+                        'metadata': {
+                            'course_id': course_id,
+                            'course_name': course_name,
+                            'text': text[:500]
+                        }
                     }
-                })
-            for i in range(0, len(vectors), 100):
-                self.index.upsert(vectors=vectors[i:i+100])
-            logger.info(f"Upserted {len(vectors)} vectors")
-            return True
+                    for i, (text, embedding) in enumerate(zip(batch, generate_embeddings(batch)), start)
+                ]
+                pinecone_limiter.acquire()
+                pending.append(self.index.upsert(vectors=vectors, async_req=True))
+            for result in pending:
+                result.get()
+            logger.info(f"Upserted {len(texts)} vectors")
+            return [f"{id_prefix}{i}" for i in range(len(texts))]
         except Exception as e:
             logger.error(f"Error upserting: {e}")
-            return False
+            return []
     
-    def search_similar_content(self, query: str, top_k: int = 5):
+    def search_similar_content(self, query: str, top_k: int = 5, query_embedding: Optional[List[float]] = None,
+                               course_filter: Optional[str] = None):
         try:
             if not self.index:
                 return []
-            query_embedding = generate_embedding(query)
-            results = self.index.query(vector=query_embedding, top_k=top_k, include_metadata=True)
+            if query_embedding is None:
+                query_embedding = generate_embedding(query)
+            pinecone_limiter.acquire()
+            results = self.index.query(vector=query_embedding, top_k=top_k, include_metadata=True,
+                                       filter=_course_filter(course_filter))
             return [{'text': m['metadata'].get('text', ''), 'score': m['score']} for m in results.get('matches', [])]
         except Exception as e:
             logger.error(f"Error searching: {e}")
             return []
+    
+    def delete_course_content(self, course_id: str):
+        try:
+            if not self.index:
+                return False
+            # Serverless indexes can't delete by metadata filter, so page through
+            # the ids upsert_syllabus_content gave this course and delete them by id
+            prefix = vector_id_prefix(course_id)
+            deleted = 0
+            for ids in self.index.list(prefix=prefix or None):
+                ids = [v for v in ids if v[len(prefix):].isdigit()]
+                if ids:
+                    self.index.delete(ids=ids)
+                    deleted += len(ids)
+            logger.info(f"Deleted {deleted} vectors for {course_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting vectors: {e}")
+            return False
+
+@lru_cache(maxsize=1024)
+def _course_filter(course_filter: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Metadata filter restricting a search to one course, built once per course."""
+    return {'course_id': course_filter} if course_filter else None
+
+class SemanticCache:
+    """Reuses Rev's answers for near-duplicate questions.
+
+    Answers live in a per-user Pinecone namespace next to the syllabus vectors,
+    keyed by the question embedding and tagged with the course filter they were
+    answered under. The namespace is cleared whenever the user's syllabi change.
+    """
+    
+    def __init__(self, manager: PineconeManager):
+        self.manager = manager
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _namespace(user_id: Optional[int]) -> str:
+        return f"answers-{user_id or 'anonymous'}"
+    
+    def lookup(self, query_embedding: List[float], user_id: Optional[int], course_filter: Optional[str]) -> Optional[str]:
+        try:
+            if not self.manager.index:
+                return None
+            pinecone_limiter.acquire()
+            results = self.manager.index.query(
+                vector=query_embedding,
+                top_k=1,
+                include_metadata=True,
+                namespace=self._namespace(user_id),
+                filter={'course_filter': course_filter or '', 'expires_at': {'$gt': time.time()}}
+            )
+            matches = results.get('matches', [])
+            if matches and matches[0]['score'] >= SEMANTIC_CACHE_THRESHOLD:
+                self.hits += 1
+                return matches[0]['metadata'].get('answer')
+        except Exception as e:
+            logger.error(f"Error reading semantic cache: {e}")
+        self.misses += 1
+        return None
+    
+    def store(self, query: str, query_embedding: List[float], answer: str, user_id: Optional[int], course_filter: Optional[str]):
+        try:
+            if not self.manager.index:
+                return
+            vector_id = hashlib.sha256(f"{course_filter or ''}|{query}".encode('utf-8')).hexdigest()
+            pinecone_limiter.acquire()
+            self.manager.index.upsert(
+                vectors=[{
+                    'id': vector_id,
+                    'values': query_embedding,
+                    'metadata': {
+                        'course_filter': course_filter or '',
+                        'answer': answer,
+                        'expires_at': time.time() + SEMANTIC_CACHE_TTL
+                    }
+                }],
+                namespace=self._namespace(user_id)
+            )
+        except Exception as e:
+            logger.error(f"Error writing semantic cache: {e}")
+    
+    def clear(self, user_id: Optional[int]):
+        """Forget a user's cached answers, e.g. after their syllabi change."""
+        try:
+            if not self.manager.index:
+                return
+            pinecone_limiter.acquire()
+            self.manager.index.delete(delete_all=True, namespace=self._namespace(user_id))
+        except Exception as e:
+            # Pinecone answers 404 for a namespace that was never written
+            if getattr(e, 'status', None) != 404:
+                logger.error(f"Error clearing semantic cache: {e}")
+    
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
 pinecone_manager = PineconeManager()
+semantic_cache = SemanticCache(pinecone_manager)
+
+def _quantize_embedding(embedding: List[float]) -> bytes:
+    """Pack an embedding as a float32 scale followed by one int8 per dimension (a quarter of float32)."""
+    scale = max(map(abs, embedding), default=0.0) / 127 or 1.0
+    return struct.pack('<f', scale) + array('b', [round(x / scale) for x in embedding]).tobytes()
+
+def _dequantize_embedding(packed: bytes) -> List[float]:
+    scale, = struct.unpack_from('<f', packed)
+    return [q * scale for q in array('b', packed[4:])]
+
+def _embedding_cache_key(text: str) -> str:
+    return "emb8:" + hashlib.sha256(f"{EMBEDDING_MODEL}|{text}".encode()).hexdigest()
+
+def get_cached_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """Look up cached embeddings in one round trip; None marks a miss (or Redis being down)."""
+    # Imported lazily: utils.jobs imports this module
+    from utils.jobs import redis_conn
+    try:
+        packed = redis_conn.mget([_embedding_cache_key(text) for text in texts])
+    except Exception as e:
+        logger.warning(f"Embedding cache unavailable: {e}")
+        return [None] * len(texts)
+    return [_dequantize_embedding(value) if value else None for value in packed]
+
+def cache_embeddings(texts: List[str], embeddings: List[List[float]]):
+    """Store freshly generated embeddings; failures are only logged."""
+    from utils.jobs import redis_conn
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for text, embedding in zip(texts, embeddings):
+            pipe.setex(_embedding_cache_key(text), EMBEDDING_CACHE_TTL, _quantize_embedding(embedding))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not cache embeddings: {e}")
 
 def generate_embedding(text: str) -> List[float]:
     try:
+        cached = get_cached_embeddings([text])[0]
+        if cached is not None:
+            return cached
         if not client:
             raise Exception("OpenAI not initialized")
+        openai_limiter.acquire(estimate_tokens(text))
         response = client.embeddings.create(input=text, model=EMBEDDING_MODEL)
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        cache_embeddings([text], [embedding])
+        return embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+def _as_stream(file_content: Union[bytes, BinaryIO]) -> BinaryIO:
+    """Wrap raw bytes so every extractor can read from a seekable file object."""
+    if isinstance(file_content, (bytes, bytearray)):
+        return io.BytesIO(file_content)
+    return file_content
+
+def generate_embeddings(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+    """Embed texts batch_size at a time instead of one request per text, skipping cached ones."""
     try:
-        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-            text = "".join(page.extract_text() or "" for page in pdf.pages)
-        return text if text.strip() else extract_text_from_pdf_pypdf2(file_content)
-    except:
-        return extract_text_from_pdf_pypdf2(file_content)
+        if not texts:
+            return []
+        embeddings = get_cached_embeddings(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing and not client:
+            raise Exception("OpenAI not initialized")
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            batch_texts = [texts[i] for i in batch]
+            openai_limiter.acquire(sum(map(estimate_tokens, batch_texts)))
+            response = client.embeddings.create(input=batch_texts, model=EMBEDDING_MODEL)
+            batch_embeddings = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+            cache_embeddings(batch_texts, batch_embeddings)
+        return embeddings
+    except Exception as e:
+        logger.error(f"Error generating embeddings: {e}")
+        raise
 
-def extract_text_from_pdf_pypdf2(file_content: bytes) -> str:
+def _join_limited(pieces: Iterable[str], max_chars: Optional[int], sep: str = "") -> str:
+    """Join pieces, pulling no more once max_chars characters are collected (None means all)."""
+    if max_chars is None:
+        return sep.join(pieces)
+    parts = []
+    length = 0
+    for piece in pieces:
+        length += len(piece) + (len(sep) if parts else 0)
+        parts.append(piece)
+        if length >= max_chars:
+            break
+    return sep.join(parts)[:max_chars]
+
+def extract_text_from_pdf(file_content: Union[bytes, BinaryIO], max_chars: Optional[int] = None) -> str:
+    # Most syllabi are born-digital, and PyPDF2 reads their text layer far faster
+    # than pdfplumber's layout engine; pdfplumber is only the fallback
+    stream = _as_stream(file_content)
+    try:
+        return extract_text_from_pdf_pypdf2(stream, max_chars)
+    except Exception as e:
+        error = e
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = "".join(page.extract_text() or "" for page in pdf_reader.pages)
+        stream.seek(0)
+        with pdfplumber.open(stream) as pdf:
+            text = _join_limited((page.extract_text() or "" for page in pdf.pages), max_chars)
+        if text.strip():
+            return text
+    except Exception:
+        pass
+    raise error
+
+def extract_text_from_pdf_pypdf2(file_content: Union[bytes, BinaryIO], max_chars: Optional[int] = None) -> str:
+    try:
+        stream = _as_stream(file_content)
+        stream.seek(0)
+        pdf_reader = PyPDF2.PdfReader(stream)
+        text = _join_limited((page.extract_text() or "" for page in pdf_reader.pages), max_chars)
         if not text.strip():
             raise Exception("No text extracted")
         return text
     except Exception as e:
         raise Exception(f"PDF extraction failed: {str(e)}")
 
-def extract_text_from_docx(file_content: bytes) -> str:
+def extract_text_from_txt(file_content: Union[bytes, BinaryIO]) -> str:
+    # Decode incrementally so the raw upload is never held in memory next to its text
+    stream = _as_stream(file_content)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parts = []
+    while chunk := stream.read(UPLOAD_READ_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    return "".join(parts)
+
+def extract_text_from_docx(file_content: Union[bytes, BinaryIO], max_chars: Optional[int] = None) -> str:
     try:
-        doc = Document(io.BytesIO(file_content))
-        text = "\n".join(p.text for p in doc.paragraphs)
-        for table in doc.tables:
-            for row in table.rows:
-                text += " " + " ".join(cell.text for cell in row.cells)
-        return text
+        doc = Document(_as_stream(file_content))
+        # Collect the pieces and join once; += on a growing string is quadratic for big tables
+        rows = (" ".join(cell.text for cell in row.cells) for table in doc.tables for row in table.rows)
+        return _join_limited(chain(["\n".join(p.text for p in doc.paragraphs)], rows), max_chars, " ")
     except Exception as e:
         raise Exception(f"DOCX extraction failed: {str(e)}")
 
-def process_uploaded_file(file_content: bytes, filename: str, user_id: int = None) -> Dict[str, Any]:
+def process_uploaded_file(file_content: Union[bytes, BinaryIO], filename: str, user_id: int = None) -> Dict[str, Any]:
+    """Extract, parse and store a syllabus.
+
+    ``file_content`` may be raw bytes or a readable file object (e.g. the
+    spooled upload stream) so large uploads never need to be copied into memory.
+    """
     try:
         ext = filename.lower().split('.')[-1]
+        # Only the first SYLLABUS_PARSE_TEXT_LIMIT characters reach the parser,
+        # so don't extract the rest of a long document
         if ext == 'pdf':
-            text = extract_text_from_pdf(file_content)
+            text = extract_text_from_pdf(file_content, SYLLABUS_PARSE_TEXT_LIMIT)
         elif ext in ['docx', 'doc']:
-            text = extract_text_from_docx(file_content)
+            text = extract_text_from_docx(file_content, SYLLABUS_PARSE_TEXT_LIMIT)
         elif ext == 'txt':
-            text = file_content.decode('utf-8')
+            text = extract_text_from_txt(file_content)
         else:
             raise Exception(f"Unsupported type: {ext}")
         if not text.strip():
@@ -173,158 +558,59 @@ def process_uploaded_file(file_content: bytes, filename: str, user_id: int = Non
         logger.error(f"Processing error: {e}")
         return {'success': False, 'error': str(e)}
 
+def _syllabus_parse_cache_key(text: str) -> str:
+    fingerprint = f"{CHAT_MODEL}|0|{SYLLABUS_PARSE_MAX_TOKENS}|{SYLLABUS_PARSE_PROMPT_VERSION}|{text}"
+    return "parse:" + hashlib.sha256(fingerprint.encode()).hexdigest()
+
+def get_cached_syllabus_parse(text: str) -> Optional[Dict[str, Any]]:
+    """Return the cached parse of this syllabus text, or None on a miss."""
+    if SYLLABUS_PARSE_CACHE == 'disabled':
+        return None
+    from utils.jobs import redis_conn
+    try:
+        cached = redis_conn.get(_syllabus_parse_cache_key(text))
+    except Exception as e:
+        logger.warning(f"Syllabus parse cache unavailable: {e}")
+        return None
+    return orjson.loads(cached) if cached else None
+
+def cache_syllabus_parse(text: str, parsed_data: Dict[str, Any]):
+    """Store a successful parse; failures are only logged."""
+    if SYLLABUS_PARSE_CACHE != 'readwrite':
+        return
+    from utils.jobs import redis_conn
+    try:
+        redis_conn.setex(_syllabus_parse_cache_key(text), SYLLABUS_PARSE_CACHE_TTL, orjson.dumps(parsed_data))
+    except Exception as e:
+        logger.warning(f"Could not cache syllabus parse: {e}")
+
 def parseSyllabusText(text: str) -> Dict[str, Any]:
     """Use OpenAI to parse syllabus and extract course info, dates, topics, and grading."""
     try:
+        text = text[:SYLLABUS_PARSE_TEXT_LIMIT]
+        cached = get_cached_syllabus_parse(text)
+        if cached is not None:
+            logger.info(f"Reused cached parse for syllabus: {cached['course']}")
+            return cached
+        
         if not client:
             raise Exception("OpenAI not initialized")
         
-        prompt = f"""You are an expert syllabus parser. Your job is to extract EVERYTHING important from this syllabus.
-DO NOT SKIP ANYTHING. Extract comprehensively and thoroughly.
-
-COURSE INFORMATION:
-Extract exactly:
-- course: Full course number and title (e.g., "CSCE 120: Program Design and Concepts")
-- instructor: Primary instructor name (or "Multiple Instructors" if several listed)
-- semester: Semester and year (e.g., "Fall 2025")
-
-KEY DATES TO EXTRACT - BE EXHAUSTIVE:
-Look for and INCLUDE:
-- **Exam dates**: "Exam 1", "Exam 2", "Exam 3", "Midterm", "Final Exam", "Quiz", with SPECIFIC DATES or WEEKS
-  - Week of Sep 22 → "Approximately September 22, 2025"
-  - Week of Oct 27 → "Approximately October 27, 2025"
-  - Week of Nov 17 → "Approximately November 17, 2025"
-  - Dec. 12 (F), 3:30 PM → "December 12, 2025, 3:30 PM - 5:30 PM"
-- **Homework due dates**: EVERY SINGLE ONE in the list
-  - Friday, September 5, 2025
-  - Friday, September 12, 2025
-  - Friday, September 19, 2025
-  - etc. ALL 10 of them
-- **Lab dates**: If recurring, capture as "Weekly during lab session"
-- **Project/Assignment milestones**: Problem Definition (Sep 19), Problem Decomposition (Oct 17), Implementation (Nov 21), Venture Capital pitch (Dec 1)
-- **Important deadlines**: Drop dates, last day of classes, any other dates mentioned
-
-For EACH date entry, provide:
-- date: The actual calendar date (convert "Week of Sep 22" to "September 22, 2025" if year appears elsewhere, or just the date)
-- event: Full description including assignment number if applicable
-- type: exam|quiz|homework|lab|project|other
-- note: Any additional context (optional)
-
-GRADING BREAKDOWN - EXTRACT EVERY COMPONENT:
-CRITICAL: Parse the grading policy section thoroughly. Extract EACH weighted category:
-
-Go through the syllabus and find ALL grading components with their weights:
-- Homework (20%)
-- Labwork (5% for sections 200,201,250 OR 10% for others)
-- Midterm Exams (36%)
-- Final Exam (24%)
-- Readings (0% for sections 200,201,250 OR 5% for others)
-- Class Engagement (5%)
-- Honors Activities (10% for sections 200,201,250 only)
-
-Extract EVERYTHING mentioned with percentages:
-{{
-  "category": "string (exact name from syllabus)",
-  "weight": number (0-100),
-  "note": "any special conditions (optional)"
-}}
-
-For this specific syllabus:
-- List all 7 grading categories
-- Include section-specific variations
-- Note that Honors students have different weightings
-
-COURSE TOPICS - EXTRACT ALL:
-Look for any section titled "Topics" or "Content" or "Course Outline". Extract EVERY SINGLE TOPIC:
-- What you (should) already know, but in C++
-- Vectors
-- Errors and Debugging
-- Object-Oriented Concepts
-- Design and Planning
-- Exceptions
-- Input/Output Streams
-- Functions – Pass by Reference
-- Class Design
-- Implementing Classes
-- Dynamic Memory
-- C-style Arrays
-- Dynamic Arrays
-- Classes with Dynamic Memory
-- Linked Lists
-- Inheritance and Polymorphism
-- Recursion
-
-Also look for learning outcomes and extract key concepts:
-- Abstraction
-- Information hiding
-- Object-oriented decomposition
-- Control structures (sequence, selection, iteration)
-- Data types (arrays, vectors, linked lists, structs, classes)
-- Debugging
-- Memory management
-- Memory leaks
-
-IMPORTANT INSTRUCTIONS:
-1. DO NOT SKIP OR MISS DATES - There are 10 homework due dates, 3 midterm exam weeks, 1 final exam, and 4 honors artifacts
-2. DO NOT MISS GRADING - Parse the grading policy section thoroughly and extract all percentages
-3. DO NOT MISS TOPICS - Both the "Topics" section AND the learning outcomes section
-4. For grading with section variations, list all variations
-5. If dates reference "Week of X" or "around Y date", convert to actual calendar dates as best you can
-6. EXTRACT NUMBERS: 20%, 36%, 24%, 5%, 10%, 0% - these are all grading percentages
-7. EXTRACT DATES: Sep 5, Sep 12, Sep 19, Oct 3, Oct 10, Oct 17, Oct 24, Nov 7, Nov 14, Dec 5, Sep 19, Oct 17, Nov 21, Dec 1
-8. EXTRACT TOPICS: ALL 16 topics listed, PLUS key concepts from learning outcomes
-
-RESPONSE FORMAT - MUST BE VALID JSON:
-{{
-  "course": "string (CSCE 120: Program Design and Concepts)",
-  "instructor": "string (multiple instructors listed)",
-  "semester": "Fall 2025",
-  "keyDates": [
-    {{
-      "date": "string (Month Day, Year or date range)",
-      "event": "string (detailed description)",
-      "type": "exam|quiz|homework|lab|project|other",
-      "note": "optional"
-    }}
-  ],
-  "topics": [
-    "string (individual topic)",
-    "string (another topic)"
-  ],
-  "gradingBreakdown": [
-    {{
-      "category": "string",
-      "weight": number,
-      "note": "optional - section variations or conditions"
-    }}
-  ]
-}}
-
-CRITICAL REMINDERS:
-- keyDates should have 15+ entries (10 homework + 3 exams + 4 honors + finals)
-- topics should have 20+ entries (16 course topics + key learning concepts)
-- gradingBreakdown should have 6-7 entries with different weights listed
-- Extract homework dates as individual entries: HW 1, HW 2, HW 3, etc.
-- Extract exam weeks and final exam dates
-- Do NOT make up any dates or topics. Only extract what is explicitly stated in the syllabus.
-- DO NOT skip or abbreviate - be comprehensive and thorough
-
-SYLLABUS TEXT:
-{text[:10000]}
-
-Return ONLY valid JSON. No markdown. No explanations. Start with {{ and end with }}."""
+        prompt = SYLLABUS_PARSE_PROMPT.format(text=text)
         
+        messages = [{"role": "user", "content": prompt}]
+        wait_for_chat_budget(messages, SYLLABUS_PARSE_MAX_TOKENS)
         response = client.chat.completions.create(
             model=CHAT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=5000,
+            messages=messages,
+            max_tokens=SYLLABUS_PARSE_MAX_TOKENS,
             temperature=0
         )
         
         result_text = response.choices[0].message.content.strip()
         
         # Try to find JSON in the response
-        json_match = re.search(r'\{[\s\S]*\}', result_text)
+        json_match = JSON_OBJECT_RE.search(result_text)
         if not json_match:
             logger.error(f"No JSON found in OpenAI response: {result_text[:500]}")
             return {
@@ -338,7 +624,7 @@ Return ONLY valid JSON. No markdown. No explanations. Start with {{ and end with
                 'assignments': 0
             }
         
-        parsed_data = json.loads(json_match.group())
+        parsed_data = orjson.loads(json_match.group())
         
         # Ensure all required fields exist
         parsed_data.setdefault('course', 'Unknown Course')
@@ -379,9 +665,10 @@ Return ONLY valid JSON. No markdown. No explanations. Start with {{ and end with
         logger.info(f"  - Found {len(parsed_data['gradingBreakdown'])} grading categories")
         logger.info(f"  - Parsed {parsed_data['exams']} exams and {parsed_data['assignments']} assignments")
         
+        cache_syllabus_parse(text, parsed_data)
         return parsed_data
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON decode error in syllabus parsing: {e}")
         return {
             'course': 'Unknown Course',
@@ -408,19 +695,19 @@ Return ONLY valid JSON. No markdown. No explanations. Start with {{ and end with
 
 def store_syllabus(data: Dict[str, Any], user_id: int = None) -> Dict[str, Any]:
     try:
-        from models import db, Syllabus
-        
         course_id = data['course'].replace(' ', '_').replace('-', '_').lower()
-        chunks = [{'text': f"Course: {data['course']} ({data['semester']})", 'course_name': data['course']}]
-        for d in data.get('keyDates', []):
-            chunks.append({'text': f"{d['event']} on {d['date']}", 'course_name': data['course']})
+        texts = [
+            f"Course: {data['course']} ({data['semester']})",
+            *(f"{d['event']} on {d['date']}" for d in data.get('keyDates', []))
+        ]
         
         # Upsert to Pinecone
-        vector_ids = pinecone_manager.upsert_syllabus_content(course_id, chunks)
+        vector_ids = pinecone_manager.upsert_syllabus_content(course_id, texts, data['course'])
         
         # Save to database if user_id provided
         if user_id:
-            syllabus = Syllabus(
+            # A Core INSERT ... RETURNING skips building an ORM object we never use
+            syllabus_id = db.session.execute(insert(Syllabus).values(
                 user_id=user_id,
                 course_id=course_id,
                 course_name=data.get('course', 'Unknown'),
@@ -429,12 +716,12 @@ def store_syllabus(data: Dict[str, Any], user_id: int = None) -> Dict[str, Any]:
                 key_dates=data.get('keyDates', []),
                 topics=data.get('topics', []),
                 grading_breakdown=data.get('gradingBreakdown', []),
-                vector_ids=[]  # Will populate with actual vector IDs if needed
-            )
-            db.session.add(syllabus)
+                vector_ids=vector_ids
+            ).returning(Syllabus.id)).scalar_one()
             db.session.commit()
+            semantic_cache.clear(user_id)
             logger.info(f"Saved syllabus to database for user {user_id}: {data['course']}")
-            return {'success': True, 'id': syllabus.id}
+            return {'success': True, 'id': syllabus_id}
         
         return {'success': True, 'id': None}
     except Exception as e:
@@ -445,20 +732,43 @@ def query_syllabus_content(query: str, course_filter: Optional[str] = None, user
     try:
         if not client:
             return "OpenAI not configured"
-        content = pinecone_manager.search_similar_content(query, 5)
+        # Embed once and use it for both the cache lookup and the content search
+        try:
+            query_embedding = generate_embedding(query)
+        except Exception:
+            query_embedding = None
+        if query_embedding is not None:
+            # Search for context while the cache is checked, so a miss doesn't pay
+            # for the two Pinecone queries one after the other
+            content_future = query_executor.submit(
+                pinecone_manager.search_similar_content, query, 5, query_embedding, course_filter
+            )
+            cached = semantic_cache.lookup(query_embedding, user_id, course_filter)
+            if cached is not None:
+                return cached
+            content = content_future.result()
+        else:
+            content = pinecone_manager.search_similar_content(query, 5, None, course_filter)
         ctx = "\n".join([f"• {c['text']}" for c in content]) if content else "No info found"
         msgs = [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "system", "content": f"Info:\n{ctx}"},
             {"role": "user", "content": query}
         ]
+        wait_for_chat_budget(msgs, 500)
         resp = client.chat.completions.create(model=CHAT_MODEL, messages=msgs, max_tokens=500)
-        return resp.choices[0].message.content
+        answer = resp.choices[0].message.content
+        if query_embedding is not None:
+            # The answer doesn't wait on the cache write
+            query_executor.submit(semantic_cache.store, query, query_embedding, answer, user_id, course_filter)
+        return answer
     except Exception as e:
         return f"Error: {str(e)}"
 
 def get_service_status():
-    return {'openai': bool(client), 'pinecone': bool(pinecone_manager.index), 'error': None}
-
-def initialize_openai_service():
-    logger.info("Service initialized") 
+    return {
+        'openai': bool(client),
+        'pinecone': bool(pinecone_manager.index),
+        'semantic_cache_hit_rate': semantic_cache.hit_rate(),
+        'error': None
+    }
@@ -4,18 +4,42 @@ Handles bank account linking, transaction retrieval, and spending analytics
 """
 
 import os
+import re
+import hashlib
+import hmac
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from itertools import islice
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Any
+import orjson
 import plaid
+from urllib3.exceptions import HTTPError
+from urllib3.util.retry import Retry
+from cryptography.fernet import Fernet, InvalidToken
 from plaid.api import plaid_api
 from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
 from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.transactions_recurring_get_request import TransactionsRecurringGetRequest
+from plaid.model.link_token_create_request import LinkTokenCreateRequest
+from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
+from plaid.model.country_code import CountryCode
+from plaid.model.products import Products
+
+from utils.jobs import redis_conn
 
 logger = logging.getLogger(__name__)
 
+# Largest page /transactions/get returns
+TRANSACTIONS_PAGE_SIZE = 500
+
 # Initialize Plaid client with explicit credentials from environment
 # The SDK needs these passed explicitly, not auto-loaded
 client_id = os.getenv('PLAID_CLIENT_ID')
@@ -30,18 +54,151 @@ configuration = plaid.Configuration(
     host=plaid.Environment.Sandbox,  # Use Production for live
 )
 
+# The SDK's urllib3 pool is shared by every PlaidManager call, so back-to-back
+# calls reuse kept-alive TLS connections; size it for concurrent requests and
+# retry transient failures with backoff. Every Plaid endpoint is a POST, which
+# urllib3 won't retry on a status unless allowed; once retries run out the last
+# response is returned so the SDK raises ApiException with its status.
+configuration.connection_pool_maxsize = 16
+configuration.retries = Retry(
+    total=5,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({'GET', 'POST'}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
 # Manually set credentials on the configuration
 configuration.api_key['clientId'] = client_id
 configuration.api_key['secret'] = secret
 configuration.api_key['plaidVersion'] = '2020-09-14'
 
+# One client per process; PlaidManager methods must use it rather than building their own
 api_client = plaid.ApiClient(configuration)
 client = plaid_api.PlaidApi(api_client)
 
+# Fans independent Plaid requests out over the client's connection pool (kept
+# within configuration.connection_pool_maxsize)
+plaid_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='plaid')
+
+# Stored access tokens are encrypted with this key (create one with Fernet.generate_key())
+token_key = os.getenv('PLAID_TOKEN_KEY')
+token_cipher = Fernet(token_key) if token_key else None
+
+if not token_cipher:
+    logger.warning("⚠️  PLAID_TOKEN_KEY not set; Plaid access tokens will be stored unencrypted")
+
+# Seconds each Plaid read is served from Redis before it is fetched again, by how
+# often the data changes. Entries are kept PLAID_CACHE_STALE_GRACE longer so a
+# Plaid outage can be answered with the last good response.
+PLAID_CACHE_TTLS = {
+    'accounts': 60,
+    'transactions': 30,
+    'recurring': 60,
+}
+PLAID_CACHE_STALE_GRACE = 15 * 60
+
+# Small reads are also kept in this worker, keyed like Redis -> (fetched_at, body),
+# so repeat requests within the TTL skip the Redis round trip too
+PLAID_LOCAL_CACHE_SIZE = 512
+_plaid_local_cache = OrderedDict()
+_plaid_local_cache_lock = Lock()
+
+# Link tokens are reused until this many seconds before Plaid expires them
+LINK_TOKEN_EXPIRY_MARGIN = 60
+
+# Recommendation rules: (category, monthly spend above which it fires, message)
+CATEGORY_SPENDING_RULES = (
+    ("FOOD_AND_DRINK", 200, "💰 Consider reducing dining out expenses - you're spending over $200/month here!"),
+    ("SHOPPING", 150, "🛍️ Your shopping spending is high. Try setting a monthly budget!"),
+)
+# Categories whose name mentions any of these count as subscriptions
+SUBSCRIPTION_CATEGORY_RE = re.compile('subscription|spotify|netflix|hulu|gym|membership', re.IGNORECASE)
+PLAID_CACHE_KEY_SECRET = (token_key or secret or '').encode()
+
+
+def cached_plaid_call(endpoint: str, local: bool = False):
+    """Cache a PlaidManager read in Redis, keyed on an HMAC of the access token and the other arguments.
+
+    With local=True fresh results are also kept in-process for what remains of their TTL.
+    """
+    ttl = PLAID_CACHE_TTLS[endpoint]
+
+    def remember(key: str, fetched_at: float, body) -> None:
+        with _plaid_local_cache_lock:
+            _plaid_local_cache[key] = (fetched_at, body)
+            _plaid_local_cache.move_to_end(key)
+            if len(_plaid_local_cache) > PLAID_LOCAL_CACHE_SIZE:
+                _plaid_local_cache.popitem(last=False)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(access_token: str, *args):
+            token_digest = hmac.new(PLAID_CACHE_KEY_SECRET, access_token.encode(), hashlib.sha256).hexdigest()[:32]
+            key = ':'.join(['plaid', endpoint, token_digest, *map(str, args)])
+            if local:
+                with _plaid_local_cache_lock:
+                    entry = _plaid_local_cache.get(key)
+                    if entry and time.time() - entry[0] < ttl:
+                        _plaid_local_cache.move_to_end(key)
+                        return entry[1]
+
+            cached = None
+            try:
+                raw = redis_conn.get(key)
+                cached = orjson.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Plaid cache unavailable: {e}")
+            if cached and time.time() - cached['ts'] < ttl:
+                if local:
+                    remember(key, cached['ts'], cached['body'])
+                return cached['body']
+
+            try:
+                body = fn(access_token, *args)
+            except (plaid.ApiException, HTTPError) as e:
+                status = getattr(e, 'status', None)
+                server_side = status is None or status == 429 or status >= 500
+                if cached and server_side:
+                    logger.warning(f"⚠️ Plaid {endpoint} failed ({status or e}); serving cached response")
+                    return cached['body']
+                raise
+
+            fetched_at = time.time()
+            if local:
+                remember(key, fetched_at, body)
+            try:
+                redis_conn.setex(key, ttl + PLAID_CACHE_STALE_GRACE,
+                                 orjson.dumps({'ts': fetched_at, 'body': body}, default=str))
+            except Exception as e:
+                logger.warning(f"Could not cache Plaid {endpoint}: {e}")
+            return body
+        return wrapper
+    return decorator
+
 
 class PlaidManager:
     """Manages Plaid API interactions for bank account integration"""
 
+    @staticmethod
+    def encrypt_access_token(access_token: str) -> str:
+        """Encrypt an access token for storage"""
+        if not token_cipher:
+            return access_token
+        return token_cipher.encrypt(access_token.encode()).decode()
+
+    @staticmethod
+    def decrypt_access_token(stored_token: str) -> str:
+        """Decrypt a stored access token"""
+        if not token_cipher or not stored_token:
+            return stored_token
+        try:
+            return token_cipher.decrypt(stored_token.encode()).decode()
+        except InvalidToken:
+            # Saved before PLAID_TOKEN_KEY was set
+            return stored_token
+
     @staticmethod
     def create_link_token(user_id: str, client_name: str = "RevOS") -> Dict[str, Any]:
         """
@@ -54,12 +211,17 @@ class PlaidManager:
         Returns:
             Dictionary containing link_token and expiration
         """
+        # Reopening Link (e.g. after navigating away) reuses the user's unexpired token
+        cache_key = f"plaid:link:{user_id}:{client_name}"
         try:
-            from plaid.model.link_token_create_request import LinkTokenCreateRequest
-            from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-            from plaid.model.country_code import CountryCode
-            from plaid.model.products import Products
+            cached = redis_conn.get(cache_key)
+            if cached:
+                logger.info(f"Plaid Link token cache hit for user {user_id}")
+                return orjson.loads(cached)
+        except Exception as e:
+            logger.warning(f"Plaid cache unavailable: {e}")
 
+        try:
             request = LinkTokenCreateRequest(
                 products=[Products("auth"), Products("transactions")],
                 client_name=client_name,
@@ -71,16 +233,32 @@ class PlaidManager:
             )
 
             response = client.link_token_create(request)
-            logger.info(f"✅ Created Plaid Link token for user {user_id}")
+            logger.info(f"✅ Created Plaid Link token for user {user_id} (cache miss)")
             
-            return {
+            result = {
                 "link_token": response.link_token,
                 "expiration": response.expiration.isoformat() if response.expiration else None,
             }
+            if response.expiration:
+                ttl = int(response.expiration.timestamp() - time.time()) - LINK_TOKEN_EXPIRY_MARGIN
+                if ttl > 0:
+                    try:
+                        redis_conn.setex(cache_key, ttl, orjson.dumps(result))
+                    except Exception as e:
+                        logger.warning(f"Could not cache Plaid Link token: {e}")
+            return result
         except Exception as e:
             logger.error(f"❌ Error creating Plaid Link token: {e}")
             raise
 
+    @staticmethod
+    def forget_link_token(user_id: str, client_name: str = "RevOS") -> None:
+        """Drop a cached Link token once its Link session has completed"""
+        try:
+            redis_conn.delete(f"plaid:link:{user_id}:{client_name}")
+        except Exception as e:
+            logger.warning(f"Could not clear cached Plaid Link token: {e}")
+
     @staticmethod
     def exchange_public_token(public_token: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -110,6 +288,7 @@ class PlaidManager:
             raise
 
     @staticmethod
+    @cached_plaid_call('accounts', local=True)
     def get_accounts(access_token: str) -> List[Dict[str, Any]]:
         """
         Get list of accounts for an access token
@@ -146,11 +325,12 @@ class PlaidManager:
             raise
 
     @staticmethod
+    @cached_plaid_call('transactions')
     def get_transactions(
         access_token: str,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        limit: int = 100,
+        limit: Optional[int] = 100,
     ) -> List[Dict[str, Any]]:
         """
         Get transactions for an access token
@@ -159,39 +339,20 @@ class PlaidManager:
             access_token: Plaid access token
             start_date: Start date (YYYY-MM-DD), defaults to 30 days ago
             end_date: End date (YYYY-MM-DD), defaults to today
-            limit: Maximum number of transactions to retrieve
+            limit: Maximum number of transactions to retrieve (None for all of them)
             
         Returns:
             List of transactions
         """
         try:
             # Default to last 30 days
-            if not end_date:
-                end_date = datetime.now().strftime("%Y-%m-%d")
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-
-            request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date,
-                options={"count": limit, "offset": 0},
-            )
+            today = date.today()
+            end_date = end_date or today.isoformat()
+            start_date = start_date or (today - timedelta(days=30)).isoformat()
 
-            response = client.transactions_get(request)
-
-            transactions = []
-            for transaction in response.transactions:
-                transactions.append({
-                    "transaction_id": transaction.transaction_id,
-                    "name": transaction.name,
-                    "amount": transaction.amount,
-                    "date": transaction.date.isoformat(),
-                    "category": transaction.category,
-                    "merchant_name": transaction.merchant_name,
-                    "account_id": transaction.account_id,
-                    "pending": transaction.pending,
-                })
+            window_start = date.fromisoformat(start_date)
+            window_end = date.fromisoformat(end_date)
+            transactions = list(PlaidManager._iter_transactions(access_token, window_start, window_end, limit))
 
             logger.info(f"✅ Retrieved {len(transactions)} transactions from {start_date} to {end_date}")
             return transactions
@@ -200,37 +361,143 @@ class PlaidManager:
             raise
 
     @staticmethod
-    def get_spending_by_category(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _iter_transactions(
+        access_token: str,
+        window_start: date,
+        window_end: date,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield formatted transactions page by page, without building the whole list"""
+        if limit is not None and limit <= 0:
+            return
+
+        def fetch_page(offset: int, count: int):
+            return client.transactions_get(TransactionsGetRequest(
+                access_token=access_token,
+                start_date=window_start,
+                end_date=window_end,
+                options=TransactionsGetRequestOptions(count=count, offset=offset),
+            ))
+
+        # The first page tells us how many transactions there are; the
+        # remaining pages are then fetched in parallel on the shared pool
+        first = fetch_page(0, TRANSACTIONS_PAGE_SIZE if limit is None else min(TRANSACTIONS_PAGE_SIZE, limit))
+        total = first.total_transactions if limit is None else min(limit, first.total_transactions)
+        pages = []
+        if first.transactions:
+            offsets = range(len(first.transactions), total, TRANSACTIONS_PAGE_SIZE)
+            pages = plaid_executor.map(
+                lambda offset: fetch_page(offset, min(TRANSACTIONS_PAGE_SIZE, total - offset)).transactions,
+                offsets
+            )
+
+        for transaction in first.transactions:
+            yield PlaidManager._format_transaction(transaction)
+        for page in pages:
+            for transaction in page:
+                yield PlaidManager._format_transaction(transaction)
+
+    @staticmethod
+    def _format_transaction(transaction) -> Dict[str, Any]:
+        """Convert a Plaid transaction model to a plain dict"""
+        return {
+            "transaction_id": transaction.transaction_id,
+            "name": transaction.name,
+            "amount": transaction.amount,
+            "date": transaction.date.isoformat(),
+            "category": transaction.category,
+            "merchant_name": transaction.merchant_name,
+            "account_id": transaction.account_id,
+            "pending": transaction.pending,
+        }
+
+    @staticmethod
+    def sync_transactions(access_token: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get the transaction changes since a /transactions/sync cursor
+        
+        Args:
+            access_token: Plaid access token
+            cursor: Cursor from the previous sync, or None for the item's full history
+            
+        Returns:
+            Dictionary with added and modified transactions, removed transaction ids
+            and the cursor to pass next time
+        """
+        try:
+            while True:
+                added, modified, removed = [], [], []
+                next_cursor = cursor
+                try:
+                    has_more = True
+                    while has_more:
+                        request_args = {"access_token": access_token, "count": TRANSACTIONS_PAGE_SIZE}
+                        if next_cursor:
+                            request_args["cursor"] = next_cursor
+                        response = client.transactions_sync(TransactionsSyncRequest(**request_args))
+                        added.extend(response.added)
+                        modified.extend(response.modified)
+                        removed.extend(t.transaction_id for t in response.removed)
+                        next_cursor = response.next_cursor
+                        has_more = response.has_more
+                except plaid.ApiException as e:
+                    # The item changed while paging; Plaid asks for a restart from the original cursor
+                    if 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION' in str(e.body):
+                        logger.warning("Plaid transactions changed during sync, restarting")
+                        continue
+                    raise
+                break
+
+            logger.info(f"✅ Synced transactions: {len(added)} added, {len(modified)} modified, {len(removed)} removed")
+            return {
+                "added": [PlaidManager._format_transaction(t) for t in added],
+                "modified": [PlaidManager._format_transaction(t) for t in modified],
+                "removed": removed,
+                "next_cursor": next_cursor,
+            }
+        except Exception as e:
+            logger.error(f"❌ Error syncing transactions: {e}")
+            raise
+
+    @staticmethod
+    def get_spending_by_category(transactions: Iterable[Dict[str, Any]], include_transactions: bool = False) -> Dict[str, Any]:
         """
         Analyze spending by category
         
         Args:
-            transactions: List of transactions
+            transactions: Transactions, read once (a list or a generator)
+            include_transactions: Also list each category's transactions
             
         Returns:
             Dictionary with spending analysis by category
         """
         try:
             spending_by_category = {}
+            total_spending = 0
+            transaction_count = 0
             
+            # One pass keeps every running total, including the overall one
             for transaction in transactions:
-                category = transaction.get("category", ["Other"])[0] if transaction.get("category") else "Other"
+                category = transaction.get("category")
+                category = category[0] if category else "Other"
                 amount = transaction.get("amount", 0)
+                total_spending += amount
+                transaction_count += 1
                 
-                if category not in spending_by_category:
-                    spending_by_category[category] = {
-                        "total": 0,
-                        "count": 0,
-                        "transactions": []
-                    }
+                entry = spending_by_category.get(category)
+                if entry is None:
+                    entry = spending_by_category[category] = {"total": 0, "count": 0}
+                    if include_transactions:
+                        entry["transactions"] = []
                 
-                spending_by_category[category]["total"] += amount
-                spending_by_category[category]["count"] += 1
-                spending_by_category[category]["transactions"].append({
-                    "name": transaction.get("name"),
-                    "amount": amount,
-                    "date": transaction.get("date"),
-                })
+                entry["total"] += amount
+                entry["count"] += 1
+                if include_transactions:
+                    entry["transactions"].append({
+                        "name": transaction.get("name"),
+                        "amount": amount,
+                        "date": transaction.get("date"),
+                    })
 
             # Sort by total spending
             sorted_categories = sorted(
@@ -243,14 +510,16 @@ class PlaidManager:
             
             return {
                 "by_category": dict(sorted_categories),
-                "total_spending": sum(cat["total"] for cat in spending_by_category.values()),
-                "average_transaction": sum(cat["total"] for cat in spending_by_category.values()) / sum(cat["count"] for cat in spending_by_category.values()) if spending_by_category else 0,
+                "total_spending": total_spending,
+                "average_transaction": total_spending / transaction_count if transaction_count else 0,
+                "transaction_count": transaction_count,
             }
         except Exception as e:
             logger.error(f"❌ Error analyzing spending: {e}")
             raise
 
     @staticmethod
+    @cached_plaid_call('recurring', local=True)
     def get_recurring_transactions(access_token: str) -> List[Dict[str, Any]]:
         """
         Get recurring transactions
@@ -278,10 +547,10 @@ class PlaidManager:
             logger.info(f"✅ Retrieved {len(recurring)} recurring transactions")
             return recurring
         except Exception as e:
+            # Raised rather than returned as [], so cached_plaid_call neither caches
+            # the failure nor skips its stale fallback
             logger.error(f"❌ Error getting recurring transactions: {e}")
-            # Recurring transactions may not be available in all environments
-            logger.warning("Recurring transactions not available in this environment")
-            return []
+            raise
 
     @staticmethod
     def get_insights(access_token: str) -> Dict[str, Any]:
@@ -296,10 +565,30 @@ class PlaidManager:
         """
         try:
             # Get transactions from last 90 days
-            end_date = datetime.now().strftime("%Y-%m-%d")
-            start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+            today = date.today()
+            end_date = today.isoformat()
+            start_date = (today - timedelta(days=90)).isoformat()
 
-            transactions = PlaidManager.get_transactions(access_token, start_date, end_date, 500)
+            transactions = PlaidManager.get_transactions(access_token, start_date, end_date, None)
+            return PlaidManager.build_insights(transactions, start_date, end_date)
+        except Exception as e:
+            logger.error(f"❌ Error generating insights: {e}")
+            raise
+
+    @staticmethod
+    def build_insights(transactions: Iterable[Dict[str, Any]], start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        Generate spending insights and recommendations from already-fetched transactions
+        
+        Args:
+            transactions: Transactions from the last 90 days
+            start_date: Start of the period (YYYY-MM-DD)
+            end_date: End of the period (YYYY-MM-DD)
+            
+        Returns:
+            Dictionary with spending insights
+        """
+        try:
             spending_analysis = PlaidManager.get_spending_by_category(transactions)
 
             # Calculate insights
@@ -307,11 +596,8 @@ class PlaidManager:
             daily_average = total_spending / 90
             
             # Get top spending categories
-            top_categories = sorted(
-                spending_analysis["by_category"].items(),
-                key=lambda x: x[1]["total"],
-                reverse=True
-            )[:5]
+            # by_category is already ordered by total
+            top_categories = list(islice(spending_analysis["by_category"].items(), 5))
 
             insights = {
                 "period": {
@@ -323,7 +609,7 @@ class PlaidManager:
                     "total_spending": total_spending,
                     "daily_average": daily_average,
                     "monthly_average": total_spending / 3,  # Approximate monthly
-                    "transaction_count": sum(cat["count"] for cat in spending_analysis["by_category"].values()),
+                    "transaction_count": spending_analysis["transaction_count"],
                 },
                 "top_categories": [
                     {
@@ -359,23 +645,16 @@ class PlaidManager:
         try:
             categories = spending_analysis.get("by_category", {})
             
-            # Check for high dining spending
-            if "FOOD_AND_DRINK" in categories:
-                amount = categories["FOOD_AND_DRINK"]["total"]
-                if amount > 200:
-                    recommendations.append("💰 Consider reducing dining out expenses - you're spending over $200/month here!")
-
-            # Check for high shopping
-            if "SHOPPING" in categories:
-                amount = categories["SHOPPING"]["total"]
-                if amount > 150:
-                    recommendations.append("🛍️ Your shopping spending is high. Try setting a monthly budget!")
+            # Check for high spending in dining, shopping, ...
+            totals = {name: cat["total"] for name, cat in categories.items()}
+            for category, threshold, message in CATEGORY_SPENDING_RULES:
+                if totals.get(category, 0) > threshold:
+                    recommendations.append(message)
 
             # Check for subscriptions
-            subscription_keywords = ["subscription", "spotify", "netflix", "hulu", "gym", "membership"]
             monthly_subscriptions = sum(
-                cat["total"] for cat_name, cat in categories.items()
-                if any(keyword in cat_name.lower() for keyword in subscription_keywords)
+                total for cat_name, total in totals.items()
+                if SUBSCRIPTION_CATEGORY_RE.search(cat_name)
             )
             if monthly_subscriptions > 50:
                 recommendations.append(f"📺 You're spending ${monthly_subscriptions:.2f}/month on subscriptions. Audit which ones you actually use!")
@@ -0,0 +1,17 @@
+"""ASGI entrypoint for RevOS.
+
+Serves the Flask app under an ASGI server so a single process can keep many
+OpenAI / Pinecone calls in flight at once:
+
+    uvicorn asgi:asgi_app --workers 4 --loop uvloop
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app.app import app
+
+# Each in-flight request occupies one thread while it waits on upstream I/O;
+# Plaid, Google and OpenAI round-trips are long, so allow plenty of them
+asgi_app = WSGIMiddleware(app, workers=int(os.getenv('ASGI_THREADS', '300')))
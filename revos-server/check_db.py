@@ -3,26 +3,23 @@ import sqlite3
 import os
 
 db_path = os.path.join(os.path.dirname(__file__), '..', 'revos.db')
+db_exists = os.path.exists(db_path)
 print(f"Checking database at: {db_path}")
-print(f"Database exists: {os.path.exists(db_path)}")
+print(f"Database exists: {db_exists}")
 
-if os.path.exists(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+if db_exists:
+    conn = sqlite3.connect(db_path, isolation_level=None)
     
     # Get users table columns
-    cursor.execute("PRAGMA table_info(users);")
-    cols = cursor.fetchall()
+    cols = conn.execute("SELECT name, type FROM pragma_table_info('users')").fetchall()
     
     print("\n✅ Users table columns:")
-    for col in cols:
-        col_name = col[1]
-        col_type = col[2]
+    for col_name, col_type in cols:
         has_google = "✓ GOOGLE CALENDAR FIELD" if "google" in col_name else ""
         print(f"  {col_name:40} {col_type:15} {has_google}")
     
     # Check for the critical columns
-    col_names = [col[1] for col in cols]
+    col_names = {col[0] for col in cols}
     required_cols = ['google_calendar_token', 'google_calendar_refresh_token', 'google_calendar_token_expiry']
     
     print(f"\n✅ Required columns present:")
@@ -14,9 +14,10 @@ except Exception as e:
 
 print("Step 2: Checking database file...")
 db_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'revos.db')
+db_exists = os.path.exists(db_file)
 print(f"  Database path: {db_file}")
-print(f"  Database exists: {os.path.exists(db_file)}")
-print(f"  Database size: {os.path.getsize(db_file) if os.path.exists(db_file) else 'N/A'} bytes")
+print(f"  Database exists: {db_exists}")
+print(f"  Database size: {os.path.getsize(db_file) if db_exists else 'N/A'} bytes")
 
 # Import models through app.py's context, not directly
 print("Step 3: Checking models...")
@@ -26,22 +27,17 @@ print(f"  User columns: {[c.name for c in User.__table__.columns]}")
 
 print("Step 4: Checking SQLite directly...")
 import sqlite3
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
+conn = sqlite3.connect(db_file, isolation_level=None)
 
 try:
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
-    print(f"  Tables in database: {[t[0] for t in tables]}")
+    tables = [t[0] for t in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    print(f"  Tables in database: {tables}")
     
-    if any(t[0] == 'users' for t in tables):
-        cursor.execute("PRAGMA table_info(users)")
-        cols = cursor.fetchall()
+    if 'users' in tables:
+        cols = conn.execute("SELECT name, type FROM pragma_table_info('users')").fetchall()
         print(f"  Users table columns:")
         google_count = 0
-        for col in cols:
-            col_name = col[1]
-            col_type = col[2]
+        for col_name, col_type in cols:
             if "google_calendar" in col_name:
                 print(f"    ✓ {col_name} ({col_type})")
                 google_count += 1
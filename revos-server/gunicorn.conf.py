@@ -0,0 +1,26 @@
+"""Gunicorn settings for serving wsgi:app.
+
+Every endpoint spends most of its time waiting on OpenAI, Pinecone, Google
+or the database, so each gevent worker multiplexes many requests and one
+worker per core is enough. Override with WEB_CONCURRENCY /
+WORKER_CONNECTIONS / PORT.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gevent'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', '1000'))
+timeout = 120
+# Import the app (and run db.create_all) once in the master before forking;
+# OpenAI/Pinecone connections are still opened lazily inside each worker
+preload_app = True
+
+
+def post_fork(server, worker):
+    # The preloaded master's SQLite pool and log listener thread must not be
+    # reused by workers
+    from app.app import reset_after_fork
+    reset_after_fork()
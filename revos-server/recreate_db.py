@@ -28,19 +28,19 @@ with app.app_context():
 # Verify the database
 import sqlite3
 
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
+conn = sqlite3.connect(db_file, isolation_level=None)
+
+# WAL is stored in the file, so the app's first connection doesn't have to
+# switch modes; synchronous is per connection and set again by the app
+conn.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;")
 
 # Check users table
-cursor.execute("PRAGMA table_info(users)")
-cols = cursor.fetchall()
+cols = conn.execute("SELECT name, type FROM pragma_table_info('users')").fetchall()
 
 print("\n📋 User table columns created in database:")
 google_cols_found = 0
 all_cols = []
-for col in cols:
-    col_name = col[1]
-    col_type = col[2]
+for col_name, col_type in cols:
     all_cols.append(col_name)
     if "google_calendar" in col_name:
         print(f"  ✓ {col_name} ({col_type})")
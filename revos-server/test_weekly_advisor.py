@@ -4,13 +4,17 @@ import sys
 
 BASE_URL = 'http://localhost:5000'
 
+# One session so login and the advisor call share a keep-alive connection
+session = requests.Session()
+session.headers.update({'User-Agent': 'revos-test'})
+
 print("=" * 60)
 print("Testing Weekly Advisor Endpoint with Formatted Response")
 print("=" * 60)
 
 # Try to login with existing user
 print("\nAttempting login...")
-login_response = requests.post(
+login_response = session.post(
     f'{BASE_URL}/api/auth/login',
     json={
         'username': 'weeklytest',
@@ -23,14 +27,12 @@ if login_response.status_code != 200:
     sys.exit(1)
 
 token = login_response.json().get('token')
+session.headers['Authorization'] = f'Bearer {token}'
 print(f"Login successful, got token")
 
 # Test the weekly-advisor endpoint
 print(f"\nFetching weekly advisor data...")
-advisor_response = requests.get(
-    f'{BASE_URL}/api/weekly-advisor',
-    headers={'Authorization': f'Bearer {token}'}
-)
+advisor_response = session.get(f'{BASE_URL}/api/weekly-advisor')
 
 if advisor_response.status_code != 200:
     print(f"Failed: {advisor_response.status_code}")
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+openai_utils = pytest.importorskip('utils.openai')
+
+
+class FakeResult:
+    def get(self):
+        return None
+
+
+class FakeIndex:
+    """The slice of the Pinecone index API PineconeManager uses, kept in a dict."""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def upsert(self, vectors, async_req=False):
+        for vector in vectors:
+            self.vectors[vector['id']] = vector
+        return FakeResult()
+
+    def list(self, prefix=None):
+        ids = sorted(v for v in self.vectors if prefix is None or v.startswith(prefix))
+        for start in range(0, len(ids), 2):
+            yield ids[start:start + 2]
+
+    def delete(self, ids):
+        for vector_id in ids:
+            del self.vectors[vector_id]
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(openai_utils, 'generate_embeddings', lambda texts: [[0.0]] * len(texts))
+    manager = openai_utils.PineconeManager()
+    manager._index = FakeIndex()
+    manager._initialized = True
+    return manager
+
+
+@pytest.mark.parametrize('course_id', [
+    'CSCE 120',
+    'CSCE 120 (Fall)',
+    'MATH 251.',
+    '_leading',
+    'trailing_',
+    '___',
+    'ÉCON',
+    '数学',
+])
+def test_delete_removes_every_upserted_vector(manager, course_id):
+    neighbours = ['CSCE 120', 'CSCE 120 (Fall)', 'CSCE', 'MATH 251']
+    for other in neighbours:
+        if other != course_id:
+            manager.upsert_syllabus_content(other, ['a', 'b', 'c'])
+    kept = set(manager.index.vectors)
+
+    vector_ids = manager.upsert_syllabus_content(course_id, ['x', 'y', 'z'])
+    added = set(manager.index.vectors) - kept
+    assert len(added) == 3
+    assert set(vector_ids) == added
+    assert all(v.startswith(openai_utils.vector_id_prefix(course_id)) for v in added)
+
+    assert manager.delete_course_content(course_id)
+    assert set(manager.index.vectors) == kept
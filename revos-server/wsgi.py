@@ -0,0 +1,11 @@
+"""WSGI entrypoint for RevOS under gunicorn's gevent workers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+# Must run before anything imports socket/ssl so OpenAI, Pinecone and
+# requests calls yield to other greenlets while waiting on the network
+from gevent import monkey
+monkey.patch_all()
+
+from app.app import app  # noqa: E402